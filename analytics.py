@@ -0,0 +1,288 @@
+"""
+Аналитика по истории прогонов печей на NumPy.
+
+Прогоны из хранилища загружаются в колоночные массивы (дата, печь,
+минуты включения/выключения программ, длительности этапов), после чего
+статистика отклонений от нормативов считается векторно за один проход:
+средние, процентили, доля прогонов выше нормы по каждому этапу,
+динамика по неделям и месяцам. Результат - сводный отчет в Markdown.
+
+Требует NumPy. Пример:
+    python analytics.py 03.2025 --db runs.sqlite3
+"""
+import argparse
+import calendar
+import sys
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from norms_book import get_norms_book
+from report_core import MONTHS, format_percent, format_time, get_deviation_symbol
+from run_store import DEFAULT_DB_PATH, RunStore
+
+# Этапы нормативов и соответствующие колонки хранилища
+STAGES = {
+    'цикл1': 'stage1_time',
+    'цикл2': 'stage2_time',
+    'перерыв': 'break_time',
+    'общее': 'total_time',
+}
+
+STAGE_TITLES = {
+    'цикл1': 'Этап 1',
+    'цикл2': 'Этап 2',
+    'перерыв': 'Перерыв',
+    'общее': 'Общее время',
+}
+
+PERCENTILES = (50, 90, 95)
+
+
+def _minutes_of_day(values: List[str]) -> np.ndarray:
+    """Векторно переводит строки ЧЧ:ММ в минуты от начала суток"""
+    if not values:
+        return np.zeros(0, dtype=np.int32)
+    digits = np.array(values, dtype='<U5').view(np.uint32).reshape(-1, 5).astype(np.int32) - ord('0')
+    return (digits[:, 0] * 10 + digits[:, 1]) * 60 + digits[:, 3] * 10 + digits[:, 4]
+
+
+@dataclass
+class RunColumns:
+    """Прогоны в колоночном виде"""
+    dates: np.ndarray                 # datetime64[D]
+    furnace_ids: np.ndarray           # индекс в furnaces
+    furnaces: List[str]
+    starts: Dict[str, np.ndarray]     # prog1/prog2 -> минута включения
+    ends: Dict[str, np.ndarray]       # prog1/prog2 -> минута выключения
+    durations: Dict[str, np.ndarray]  # этап норматива -> минуты
+
+    def __len__(self):
+        return len(self.dates)
+
+
+def load_runs(store: RunStore, start=None, end=None) -> RunColumns:
+    """Загружает прогоны за период в колоночные массивы"""
+    columns = ['run_date', 'furnace', 'prog1_start', 'prog1_end',
+               'prog2_start', 'prog2_end'] + list(STAGES.values())
+    rows = store.select(columns, start, end).fetchall()
+    data = list(zip(*rows)) if rows else [[] for _ in columns]
+
+    furnaces, furnace_ids = np.unique(np.array(data[1], dtype=str), return_inverse=True)
+    return RunColumns(
+        dates=np.array(data[0], dtype='datetime64[D]'),
+        furnace_ids=furnace_ids.astype(np.int32),
+        furnaces=[str(f) for f in furnaces],
+        starts={'prog1': _minutes_of_day(data[2]), 'prog2': _minutes_of_day(data[4])},
+        ends={'prog1': _minutes_of_day(data[3]), 'prog2': _minutes_of_day(data[5])},
+        durations={stage: np.array(data[6 + i], dtype=np.float64)
+                   for i, stage in enumerate(STAGES)},
+    )
+
+
+def _norm_lookup(cols: RunColumns, stage: str, norms: Dict) -> np.ndarray:
+    """Норматив этапа для каждой печи (NaN для печей без норматива)"""
+    return np.array([norms.get(f, {}).get(stage, np.nan) for f in cols.furnaces],
+                    dtype=np.float64)
+
+
+def norm_columns(cols: RunColumns, norms: Optional[Dict] = None) -> Dict[str, np.ndarray]:
+    """
+    Норматив каждого этапа для каждого прогона. Без явных norms берутся
+    нормативы из файла, действовавшие на дату прогона.
+    """
+    result = {stage: np.full(len(cols), np.nan) for stage in STAGES}
+    if not len(cols):
+        return result
+    if norms is not None:
+        periods = [(None, None, norms)]
+    else:
+        periods = [(np.datetime64(start, 'D'), end and np.datetime64(end, 'D'), furnaces)
+                   for start, end, furnaces in get_norms_book().periods()]
+    for start, end, period_norms in periods:
+        mask = np.ones(len(cols), dtype=bool)
+        if start is not None:
+            mask &= cols.dates >= start
+        if end is not None:
+            mask &= cols.dates < end
+        if not mask.any():
+            continue
+        for stage in STAGES:
+            result[stage][mask] = _norm_lookup(cols, stage, period_norms)[cols.furnace_ids[mask]]
+    return result
+
+
+def deviations(cols: RunColumns, norms: Optional[Dict] = None,
+               norm_values: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, np.ndarray]:
+    """Отклонения от нормы в процентах по каждому этапу для всех прогонов"""
+    norm_values = norm_columns(cols, norms) if norm_values is None else norm_values
+    return {stage: (values - norm_values[stage]) / norm_values[stage] * 100
+            for stage, values in cols.durations.items()}
+
+
+@dataclass
+class StageStats:
+    """Статистика одного этапа одной печи"""
+    count: int
+    norm: float
+    mean: float
+    percentiles: Dict[int, float]
+    mean_deviation: float
+    over_norm_share: float  # доля прогонов выше нормы, 0..1
+
+
+def furnace_stats(cols: RunColumns, norms: Optional[Dict] = None) -> Dict[str, Dict[str, StageStats]]:
+    """
+    Статистика отклонений по печам и этапам.
+    Норма в статистике - действовавшая на дату последнего прогона печи.
+    """
+    norm_values = norm_columns(cols, norms)
+    devs = deviations(cols, norm_values=norm_values)
+    result = {}
+    for fid, furnace in enumerate(cols.furnaces):
+        mask = cols.furnace_ids == fid
+        count = int(mask.sum())
+        stats = {}
+        for stage, values in cols.durations.items():
+            selected = values[mask]
+            stage_devs = devs[stage][mask]
+            pct = np.percentile(selected, PERCENTILES)
+            stats[stage] = StageStats(
+                count=count,
+                norm=float(norm_values[stage][mask][-1]) if count else np.nan,
+                mean=float(selected.mean()),
+                percentiles={p: float(v) for p, v in zip(PERCENTILES, pct)},
+                mean_deviation=float(np.nanmean(stage_devs)) if count else np.nan,
+                over_norm_share=float((stage_devs > 0).mean()),
+            )
+        result[furnace] = stats
+    return result
+
+
+def period_starts(dates: np.ndarray, period: str) -> np.ndarray:
+    """Начало недели (понедельник) или месяца для каждой даты"""
+    if period == 'month':
+        return dates.astype('datetime64[M]').astype('datetime64[D]')
+    # 1970-01-01 - четверг: сдвиг (дни + 3) % 7 дает номер дня недели с понедельника
+    days = dates.astype(np.int64)
+    return (days - (days + 3) % 7).astype('datetime64[D]')
+
+
+def trends(cols: RunColumns, period: str = 'week',
+           norms: Optional[Dict] = None) -> Dict[str, List[tuple]]:
+    """
+    Средние отклонения по периодам (неделям или месяцам) для каждой печи.
+    Возвращает {печь: [(начало периода, число прогонов, {этап: отклонение})]}.
+    """
+    devs = deviations(cols, norms)
+    starts = period_starts(cols.dates, period)
+    result = {}
+    for fid, furnace in enumerate(cols.furnaces):
+        mask = cols.furnace_ids == fid
+        keys, inverse = np.unique(starts[mask], return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(keys))
+        means = {stage: np.bincount(inverse, weights=values[mask], minlength=len(keys)) / counts
+                 for stage, values in devs.items()}
+        result[furnace] = [
+            (keys[i].astype(date), int(counts[i]), {stage: float(means[stage][i]) for stage in devs})
+            for i in range(len(keys))
+        ]
+    return result
+
+
+def _deviation_cell(value: float) -> str:
+    if np.isnan(value):
+        return '—'
+    return f"{get_deviation_symbol(round(value, 2))} {format_percent(value)}%"
+
+
+def _period_title(start: date, period: str) -> str:
+    if period == 'month':
+        return f"{MONTHS[start.month - 1]} {start.year}"
+    return f"с {start:%d.%m.%Y}"
+
+
+def render_summary(cols: RunColumns, title: str, norms: Optional[Dict] = None) -> str:
+    """Формирует сводный отчет по прогонам в формате Markdown"""
+    lines = [f"📈 **СВОДКА ПО ТЕРМООБРАБОТКЕ** 📈",
+             f"**{title}** | прогонов: **{len(cols)}**"]
+    if not len(cols):
+        lines.append("Нет данных за период")
+        return '\n'.join(lines)
+
+    stats = furnace_stats(cols, norms)
+    by_week = trends(cols, 'week', norms)
+    by_month = trends(cols, 'month', norms)
+    pct_titles = ' | '.join(f"P{p}" for p in PERCENTILES)
+
+    for furnace, stage_stats in stats.items():
+        count = next(iter(stage_stats.values())).count
+        lines += [
+            '▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬',
+            f"🔘 **{furnace.upper()}** | прогонов: **{count}**",
+            '',
+            f"| Этап | Норма | Среднее | {pct_titles} | Отклонение | Выше нормы |",
+            '|' + '---|' * (5 + len(PERCENTILES)),
+        ]
+        for stage, s in stage_stats.items():
+            pct = ' | '.join(format_time(round(s.percentiles[p])) for p in PERCENTILES)
+            norm = '—' if np.isnan(s.norm) else format_time(s.norm)
+            lines.append(
+                f"| {STAGE_TITLES[stage]} | {norm} | {format_time(round(s.mean))} | {pct} "
+                f"| {_deviation_cell(s.mean_deviation)} | {format_percent(s.over_norm_share * 100)}% |")
+
+        for period, caption, data in (('week', 'по неделям', by_week[furnace]),
+                                      ('month', 'по месяцам', by_month[furnace])):
+            if len(data) < 2:
+                continue
+            lines += [
+                '',
+                f"📊 **Динамика {caption}** (среднее отклонение от нормы)",
+                '',
+                '| Период | Прогонов | ' + ' | '.join(STAGE_TITLES[s] for s in STAGES) + ' |',
+                '|' + '---|' * (2 + len(STAGES)),
+            ]
+            for start, count, means in data:
+                cells = ' | '.join(_deviation_cell(means[s]) for s in STAGES)
+                lines.append(f"| {_period_title(start, period)} | {count} | {cells} |")
+    lines.append('▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬')
+    return '\n'.join(lines)
+
+
+def monthly_summary(store: RunStore, year: int, month: int,
+                    norms: Optional[Dict] = None) -> str:
+    """Сводный отчет за календарный месяц"""
+    first = date(year, month, 1)
+    last = date(year, month, calendar.monthrange(year, month)[1])
+    cols = load_runs(store, first, last)
+    return render_summary(cols, f"за {MONTHS[month - 1]} {year}", norms)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Сводный отчет по прогонам за месяц')
+    parser.add_argument('month', help='месяц в формате мм.гггг')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH,
+                        help=f'хранилище прогонов (по умолчанию {DEFAULT_DB_PATH})')
+    parser.add_argument('-o', '--output', help='файл отчета (по умолчанию Сводка_мм_гггг.md)')
+    args = parser.parse_args(argv)
+
+    try:
+        month, year = (int(part) for part in args.month.split('.'))
+        if not 1 <= month <= 12:
+            raise ValueError
+    except ValueError:
+        parser.error('месяц нужно указать в формате мм.гггг')
+
+    with RunStore(args.db) as store:
+        summary = monthly_summary(store, year, month)
+    output = args.output or f"Сводка_{month:02d}_{year}.md"
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(summary)
+    print(f"Сводка сохранена: {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+Обнаружение необычных прогонов.
+
+Для каждой печи и каждого этапа (цикл1, цикл2, перерыв, общее и этапы
+из файла нормативов) ведутся две экспоненциально сглаженные оценки
+длительности - быстрая (последние прогоны) и медленная (обычное
+поведение печи) - со своей дисперсией. Обновление на прогон - O(1)
+на этап, история прогонов в памяти не хранится.
+
+Предупреждения двух видов:
+- выброс: длительность этапа далеко от обычной для этой печи
+  (больше Z_LIMIT стандартных отклонений);
+- дрейф: быстрая оценка устойчиво ушла от медленной, например
+  цикл1 понемногу растет из-за износа нагревателя, хотя каждый
+  отдельный прогон еще в пределах разброса.
+
+Сравнение идет с собственной историей печи, а не с процентом от
+норматива. Начальное состояние набирается за один проход по хранилищу
+(warm_start).
+"""
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from report_core import RunMetrics, format_time
+
+# Вес нового прогона в быстрой и медленной оценках
+FAST_ALPHA = 0.2
+SLOW_ALPHA = 0.02
+
+# Порог выброса, стандартных отклонений от обычной длительности
+Z_LIMIT = 3.5
+# Порог дрейфа: расхождение быстрой и медленной оценок, стандартных отклонений
+DRIFT_LIMIT = 1.5
+# Сколько прогонов печи нужно, прежде чем делать выводы
+MIN_RUNS = 20
+# Нижняя граница разброса, минуты: у очень стабильной печи
+# отклонение на пару минут не должно считаться выбросом
+MIN_STD = 5.0
+
+# Колонки хранилища для начального заполнения и соответствующие этапы
+_STORE_STAGES = (
+    ('цикл1', 'stage1_time'),
+    ('цикл2', 'stage2_time'),
+    ('перерыв', 'break_time'),
+    ('общее', 'total_time'),
+)
+
+
+class StageStats:
+    """
+    Сглаженные оценки длительности одного этапа печи: быстрая и медленная
+    средние и разброс прогонов вокруг быстрой (текущего уровня). Разброс
+    считается от текущего уровня, чтобы медленный дрейф не раздувал его
+    и не маскировал сам себя.
+    """
+    __slots__ = ('count', 'fast', 'slow', 'var')
+
+    def __init__(self):
+        self.count = 0
+        self.fast = 0.0
+        self.slow = 0.0
+        self.var = 0.0
+
+    def update(self, minutes: float):
+        self.count += 1
+        if self.count > MIN_RUNS:
+            # Одиночный выброс (авария, ошибка ввода) не должен
+            # раздувать обычный разброс печи
+            limit = Z_LIMIT * self.std
+            minutes = min(max(minutes, self.fast - limit), self.fast + limit)
+        # Пока прогонов мало, оценки - обычные средние по всем прогонам
+        # (иначе они смещены к первому прогону)
+        fast_alpha = max(FAST_ALPHA, 1 / self.count)
+        slow_alpha = max(SLOW_ALPHA, 1 / self.count)
+        residual = minutes - self.fast
+        if self.count > 1:
+            self.var += slow_alpha * (residual * residual - self.var)
+        self.fast += fast_alpha * residual
+        self.slow += slow_alpha * (minutes - self.slow)
+
+    @property
+    def std(self) -> float:
+        return max(math.sqrt(self.var), MIN_STD)
+
+
+def stage_durations(run_metrics: RunMetrics) -> Dict[str, int]:
+    """Длительности всех этапов прогона, минуты"""
+    if run_metrics.stages:
+        return run_metrics.stages
+    return {'цикл1': run_metrics.stage1_time, 'цикл2': run_metrics.stage2_time,
+            'перерыв': run_metrics.break_time, 'общее': run_metrics.total_time}
+
+
+class AnomalyDetector:
+    def __init__(self):
+        self.stats: Dict[Tuple[str, str], StageStats] = {}
+
+    def update(self, furnace: str, stages: Dict[str, int]):
+        """Учитывает прогон печи в статистике"""
+        for stage, minutes in stages.items():
+            stats = self.stats.get((furnace, stage))
+            if stats is None:
+                stats = self.stats[(furnace, stage)] = StageStats()
+            stats.update(minutes)
+
+    def check(self, furnace: str, stages: Dict[str, int]) -> List[str]:
+        """Предупреждения по прогону (статистика не изменяется)"""
+        warnings = []
+        for stage, minutes in stages.items():
+            stats = self.stats.get((furnace, stage))
+            if stats is None or stats.count < MIN_RUNS:
+                continue
+            std = stats.std
+            usual = f"обычно {format_time(round(stats.slow))} ± {format_time(round(std))}"
+            if abs(minutes - stats.slow) > Z_LIMIT * std:
+                trend = 'дольше' if minutes > stats.slow else 'короче'
+                warnings.append(f"{stage} {format_time(minutes)} заметно {trend} обычного ({usual})")
+                continue
+            # Дрейф с учетом текущего прогона
+            fast = stats.fast + FAST_ALPHA * (minutes - stats.fast)
+            if abs(fast - stats.slow) > DRIFT_LIMIT * std:
+                trend = 'растет' if fast > stats.slow else 'сокращается'
+                warnings.append(f"{stage} {trend}: в последних прогонах около "
+                                f"{format_time(round(fast))} ({usual})")
+        return warnings
+
+    def warnings_text(self, furnace: str, stages: Dict[str, int]) -> str:
+        """Текст предупреждений для поля уведомлений (пусто, если прогон обычный)"""
+        warnings = self.check(furnace, stages)
+        if not warnings:
+            return ''
+        return f"Внимание, {furnace}: " + '; '.join(warnings)
+
+    def warm_start(self, store, start=None, end=None, furnace: Optional[str] = None) -> int:
+        """
+        Набирает статистику по прогонам из хранилища за один проход
+        (в порядке дат). Возвращает число учтенных прогонов.
+        """
+        columns = ('furnace',) + tuple(column for _, column in _STORE_STAGES)
+        stages = tuple(stage for stage, _ in _STORE_STAGES)
+        return self.feed((row[0], dict(zip(stages, row[1:])))
+                         for row in store.select(columns, start, end, furnace))
+
+    def feed(self, runs: Iterable[Tuple[str, Dict[str, int]]]) -> int:
+        """Учитывает последовательность (печь, длительности этапов)"""
+        count = 0
+        for furnace, stages in runs:
+            self.update(furnace, stages)
+            count += 1
+        return count
@@ -0,0 +1,244 @@
+"""
+Набор замеров производительности генератора отчетов.
+
+Замеряются:
+- calc      - calculate_time_difference / calculate_deviation / format_time
+              на синтетических прогонах
+- render    - формирование отчета по шаблону (render_report)
+- write     - запись раздела печи в ежедневный отчет (DailyReport)
+- calendar  - перестроение CalendarWidget.create_calendar (нужен Kivy)
+- startup   - создание ReportGenerator (нужен Kivy)
+
+Замеры Kivy пропускаются, если Kivy не установлен или указан --no-gui.
+Результаты (время одной операции) сохраняются как базовая линия в JSON;
+при следующих запусках время сравнивается с ней, и замедление больше
+порога считается регрессией (код возврата 1).
+
+Пример:
+    python benchmarks.py --save-baseline
+    python benchmarks.py --only calc,render --threshold 0.2
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import report_core
+from daily_report import DailyReport
+from report_core import NORMS, FurnaceRun
+
+DEFAULT_BASELINE = 'benchmarks_baseline.json'
+DEFAULT_THRESHOLD = 0.15
+
+# имя -> (функция подготовки, нужен ли Kivy)
+BENCHMARKS: Dict[str, tuple] = {}
+
+
+def benchmark(name: str, gui: bool = False):
+    """
+    Регистрирует замер. Функция подготовки получает масштаб n и возвращает
+    пару (функция замера, число операций за один ее вызов) или тройку
+    с функцией очистки третьим элементом (вызывается после замера).
+    """
+    def register(func):
+        BENCHMARKS[name] = (func, gui)
+        return func
+    return register
+
+
+def synthetic_runs(n: int, seed: int = 1) -> List[FurnaceRun]:
+    """Случайные, но воспроизводимые прогоны для замеров"""
+    rnd = random.Random(seed)
+    furnaces = list(NORMS)
+
+    runs = []
+    for i in range(n):
+        start = rnd.randrange(24 * 60)
+        p1_end = start + rnd.randint(400, 700)
+        p2_start = p1_end + rnd.randint(20, 80)
+        p2_end = p2_start + rnd.randint(150, 260)
+        runs.append(FurnaceRun(
+            date=f"{1 + i % 28:02d}.{1 + i // 28 % 12:02d}.2025",
+            furnace=furnaces[i % len(furnaces)],
+            prog1_start=start, prog1_end=p1_end,
+            prog2_start=p2_start, prog2_end=p2_end,
+        ))
+    return runs
+
+
+@benchmark('calc')
+def bench_calc(n):
+    runs = [r.as_text() for r in synthetic_runs(min(n, 10000))]
+    norms = NORMS['Печь 1']
+    repeat = max(1, n // len(runs))
+
+    def run():
+        for _ in range(repeat):
+            for r in runs:
+                minutes = report_core.calculate_time_difference(r['prog1_start'], r['prog1_end'])
+                report_core.calculate_deviation(minutes, norms['цикл1'])
+                report_core.format_time(minutes)
+    return run, repeat * len(runs)
+
+
+@benchmark('render')
+def bench_render(n):
+    runs = synthetic_runs(min(n, 10000))
+    metrics = [report_core.compute_metrics(r) for r in runs]
+    pairs = list(zip(runs, metrics))
+
+    def run():
+        for r, m in pairs:
+            report_core.render_report(r, m)
+    return run, len(pairs)
+
+
+@benchmark('write')
+def bench_write(n):
+    runs = synthetic_runs(min(n // 100 or 1, 200))
+    pairs = [(r, report_core.compute_metrics(r)) for r in runs]
+    root = tempfile.TemporaryDirectory(prefix='bench_write_')
+
+    def run():
+        # Каждый повтор пишет в пустой каталог: замеряется создание отчетов,
+        # а не перезапись уже записанных прошлым повтором
+        directory = tempfile.mkdtemp(dir=root.name)
+        for r, m in pairs:
+            path = os.path.join(directory, report_core.report_filename(r.date))
+            report = DailyReport.load(path, r.date)
+            report.set_run(r, m)
+            report.save(path)
+    return run, len(pairs), root.cleanup
+
+
+@benchmark('calendar', gui=True)
+def bench_calendar(n):
+    from calendar_widget import CalendarWidget
+
+    widget = CalendarWidget(callback=lambda date: None)
+    steps = max(12, n // 10000)
+
+    def run():
+        for _ in range(steps):
+            widget.previous_month(None)
+    return run, steps
+
+
+@benchmark('startup', gui=True)
+def bench_startup(n):
+    from report_generator import ReportGenerator
+
+    count = max(1, n // 100000)
+
+    def run():
+        # Замеряется только первый экран: хранилище, очередь записи и черновик
+        # открывает start_services после первого кадра, здесь он не вызывается.
+        # close() снимает интервал Clock, иначе он копится от повтора к повтору
+        for _ in range(count):
+            ReportGenerator().close()
+    return run, count
+
+
+def measure(func: Callable, ops: int, repeat: int) -> float:
+    """Лучшее из repeat время одной операции в секундах"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best / ops
+
+
+def run_benchmarks(names: List[str], n: int, repeat: int, gui: bool) -> Dict[str, float]:
+    if gui:
+        # Kivy без аргументов командной строки и без вывода лога в консоль
+        os.environ.setdefault('KIVY_NO_ARGS', '1')
+        os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+    results = {}
+    for name in names:
+        setup, needs_gui = BENCHMARKS[name]
+        if needs_gui and not gui:
+            continue
+        try:
+            func, ops, *cleanup = setup(n)
+        except ImportError as e:
+            print(f"{name:10s} пропущен: {e}")
+            continue
+        try:
+            results[name] = measure(func, ops, repeat)
+        finally:
+            for func in cleanup:
+                func()
+        print(f"{name:10s} {results[name] * 1e6:12.2f} мкс/оп  ({ops} оп.)")
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float],
+            threshold: float) -> List[str]:
+    """Возвращает описания регрессий относительно базовой линии"""
+    regressions = []
+    for name, value in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        change = value / base - 1
+        mark = 'РЕГРЕССИЯ' if change > threshold else 'ок'
+        print(f"{name:10s} {change * 100:+8.1f}% к базовой линии  {mark}")
+        if change > threshold:
+            regressions.append(f"{name}: {change * 100:+.1f}%")
+    return regressions
+
+
+def _load_baseline(path: str) -> Optional[Dict[str, float]]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замеры производительности генератора отчетов')
+    parser.add_argument('--only', help='замеры через запятую: ' + ', '.join(BENCHMARKS))
+    parser.add_argument('-n', type=int, default=1000000,
+                        help='масштаб (число синтетических операций для calc)')
+    parser.add_argument('--repeat', type=int, default=3, help='число повторов, берется лучший')
+    parser.add_argument('--no-gui', action='store_true', help='пропустить замеры Kivy')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help=f'файл базовой линии (по умолчанию {DEFAULT_BASELINE})')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='сохранить результаты как новую базовую линию')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='допустимое замедление, доля (по умолчанию 0.15)')
+    args = parser.parse_args(argv)
+
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"неизвестные замеры: {', '.join(unknown)}")
+
+    results = run_benchmarks(names, args.n, args.repeat, gui=not args.no_gui)
+
+    if args.save_baseline:
+        baseline = _load_baseline(args.baseline) or {}
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Базовая линия сохранена: {args.baseline}")
+        return 0
+
+    baseline = _load_baseline(args.baseline)
+    if baseline is None:
+        print(f"Базовая линия {args.baseline} не найдена, сравнение пропущено")
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+Виджет календаря для выбора даты.
+Загружается лениво при первом открытии календаря, чтобы не замедлять запуск.
+
+Дни с отчетами раскрашиваются по худшему отклонению за день (выше нормы,
+ниже нормы, в норме). Сводка месяца берется одним запросом к индексу
+по дням (RunStore.month_index), каталог отчетов не сканируется.
+"""
+import calendar
+from datetime import date, datetime
+from functools import lru_cache
+
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.button import Button
+from kivy.uix.gridlayout import GridLayout
+from kivy.uix.label import Label
+
+import metrics
+
+WEEKDAYS = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+
+# Максимум недель в месяце - сетка всегда содержит 6 строк по 7 дней
+GRID_CELLS = 6 * 7
+
+DAY_COLOR = (1, 1, 1, 1)
+TODAY_COLOR = (0.5, 0.8, 0.5, 1)  # Зеленый для текущего дня
+
+# Цвета дней с отчетами по худшему отклонению за день
+STATUS_COLORS = {
+    'over': (0.95, 0.5, 0.45, 1),   # выше нормы
+    'under': (0.5, 0.7, 0.95, 1),   # ниже нормы
+    'norm': (0.55, 0.85, 0.55, 1),  # в соответствии с нормой
+}
+
+
+def day_status(max_dev: float, min_dev: float) -> str:
+    """Статус дня по отклонению с наибольшим модулем"""
+    worst = max_dev if max_dev >= -min_dev else min_dev
+    worst = round(worst, 2)
+    if worst > 0:
+        return 'over'
+    if worst < 0:
+        return 'under'
+    return 'norm'
+
+
+@lru_cache(maxsize=64)
+def month_grid(year, month):
+    """
+    Возвращает дни месяца в виде плоского кортежа из GRID_CELLS элементов.
+    Нули обозначают пустые ячейки до начала и после конца месяца.
+    """
+    days = [day for week in calendar.monthcalendar(year, month) for day in week]
+    return tuple(days + [0] * (GRID_CELLS - len(days)))
+
+
+class CalendarWidget(GridLayout):
+    """
+    Виджет календаря для выбора даты.
+    Возможности:
+    - Отображение текущего месяца
+    - Навигация по месяцам
+    - Выделение текущей даты
+    - Выбор даты кликом
+    - Раскраска дней с отчетами; клик по такому дню открывает отчет
+
+    index(year, month) возвращает сводку месяца {день: (прогонов,
+    наибольшее отклонение, наименьшее отклонение)}; on_open(date)
+    вызывается при выборе дня, за который есть отчет.
+    """
+    def __init__(self, callback, index=None, on_open=None, **kwargs):
+        super().__init__(**kwargs)
+        self.cols = 7
+        self.callback = callback
+        self.index = index
+        self.on_open = on_open
+        self.day_index = {}
+        # Храним первое число месяца: replace(month=...) не должен падать на 31-м числе
+        self.current_date = datetime.now().replace(day=1)
+        self.day_cells = []
+        
+        # Создаем основной layout
+        self.main_layout = BoxLayout(orientation='vertical')
+        
+        # Создаем панель навигации
+        nav_layout = BoxLayout(size_hint_y=None, height=40)
+        
+        # Кнопки для переключения месяцев
+        self.prev_month = Button(text='<', size_hint_x=None, width=40)
+        self.next_month = Button(text='>', size_hint_x=None, width=40)
+        
+        # Метка с текущим месяцем и годом
+        self.month_year_label = Label(text=self.get_month_year_text())
+        
+        # Добавляем элементы в панель навигации
+        nav_layout.add_widget(self.prev_month)
+        nav_layout.add_widget(self.month_year_label)
+        nav_layout.add_widget(self.next_month)
+        
+        # Привязываем обработчики к кнопкам
+        self.prev_month.bind(on_press=self.previous_month)
+        self.next_month.bind(on_press=self.next_month_handler)
+        
+        # Добавляем панель навигации в основной layout
+        self.main_layout.add_widget(nav_layout)
+        
+        # Создаем grid для календаря
+        self.calendar_grid = GridLayout(cols=7)
+        self.create_calendar()
+        self.main_layout.add_widget(self.calendar_grid)
+        
+        # Добавляем основной layout
+        self.add_widget(self.main_layout)
+
+    def get_month_year_text(self):
+        """Форматирует текст с названием месяца и годом"""
+        months = ['Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
+                 'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь']
+        return f"{months[self.current_date.month - 1]} {self.current_date.year}"
+
+    def create_calendar(self):
+        """
+        Создает календарную сетку.
+        Ячейки создаются один раз, при смене месяца они только переподписываются.
+        """
+        with metrics.span('calendar'):
+            self._fill_calendar()
+
+    def _fill_calendar(self):
+        if not self.day_cells:
+            # Добавляем названия дней недели
+            for day in WEEKDAYS:
+                self.calendar_grid.add_widget(Label(text=day))
+
+            for _ in range(GRID_CELLS):
+                btn = Button()
+                btn.bind(on_press=self.on_day_press)
+                self.calendar_grid.add_widget(btn)
+                self.day_cells.append(btn)
+
+        year, month = self.current_date.year, self.current_date.month
+        today = date.today()
+        today_day = today.day if (today.year, today.month) == (year, month) else 0
+        self.day_index = self.index(year, month) if self.index is not None else {}
+
+        for btn, day in zip(self.day_cells, month_grid(year, month)):
+            if day == 0:
+                # Пустая ячейка
+                btn.text = ''
+                btn.disabled = True
+                btn.opacity = 0
+            else:
+                btn.text = str(day)
+                btn.disabled = False
+                btn.opacity = 1
+                btn.bold = day == today_day
+                summary = self.day_index.get(day)
+                if summary is not None:
+                    btn.background_color = STATUS_COLORS[day_status(summary[1], summary[2])]
+                else:
+                    btn.background_color = TODAY_COLOR if day == today_day else DAY_COLOR
+
+    def on_day_press(self, btn):
+        """Обработчик нажатия на ячейку дня"""
+        if btn.text:
+            self.on_day_select(int(btn.text))
+
+    def previous_month(self, instance):
+        """Переключает на предыдущий месяц"""
+        if self.current_date.month == 1:
+            self.current_date = self.current_date.replace(year=self.current_date.year - 1, month=12)
+        else:
+            self.current_date = self.current_date.replace(month=self.current_date.month - 1)
+        
+        self.month_year_label.text = self.get_month_year_text()
+        self.create_calendar()
+
+    def next_month_handler(self, instance):
+        """Переключает на следующий месяц"""
+        if self.current_date.month == 12:
+            self.current_date = self.current_date.replace(year=self.current_date.year + 1, month=1)
+        else:
+            self.current_date = self.current_date.replace(month=self.current_date.month + 1)
+        
+        self.month_year_label.text = self.get_month_year_text()
+        self.create_calendar()
+
+    def on_day_select(self, day):
+        """Обработчик выбора дня"""
+        date = f"{day:02d}.{self.current_date.month:02d}.{self.current_date.year}"
+        self.callback(date)
+        if day in self.day_index and self.on_open is not None:
+            self.on_open(date)
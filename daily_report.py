@@ -0,0 +1,355 @@
+"""
+Ежедневный сводный отчет по нескольким печам.
+
+Файл отчета за дату состоит из шапки и разделов по каждой печи
+(см. Шаблон.md). Модель хранит разделы как готовый текст, поэтому
+отправка одной печи заменяет или вставляет только ее раздел,
+а разделы остальных печей переносятся без изменений.
+Печи можно отправлять независимо и в любом порядке.
+
+Каталог отчетов может быть общим для нескольких рабочих мест (сетевая
+папка). Сохранение устроено как оптимистичная запись: текст готовится
+и сбрасывается на диск во временный файл без блокировки, а под
+блокировкой (файл .<отчет>.lock) только сверяется версия файла
+(хеш содержимого на момент загрузки) и выполняется переименование -
+блокировка держится миллисекунды. Если отчет успел изменить другой
+оператор, свои разделы печей накладываются на его версию и запись
+повторяется, поэтому разделы разных печей объединяются автоматически.
+"""
+import hashlib
+import os
+import re
+import socket
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import report_archive
+from norms_book import furnace_names
+from report_core import FurnaceRun, RunMetrics, render_header, render_section
+
+SECTION_SEPARATOR = '▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬'
+
+# Начало раздела печи: строка-разделитель и строка с названием печи
+SECTION_START = re.compile(
+    r'^' + SECTION_SEPARATOR + r'[ \t]*\n🔘 \*\*(?P<furnace>[^*\n]+)\*\*', re.MULTILINE)
+
+
+# Ожидание чужой блокировки отчета, секунды
+LOCK_TIMEOUT = 10.0
+# Блокировка старше этого возраста осталась от упавшего процесса
+# (обычно она держится миллисекунды), секунды
+STALE_LOCK_AGE = 30.0
+# Сколько раз пытаться наложить свои разделы на чужие изменения
+SAVE_ATTEMPTS = 20
+
+
+class ReportConflictError(OSError):
+    """Отчет все время меняется другими рабочими местами - запись не удалась"""
+
+
+def _write_temp(path: str, text: str, sync: bool = True) -> str:
+    """
+    Записывает текст во временный файл рядом с path и сбрасывает его
+    на диск (без sync сброс остается за вызывающим)
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        # mkstemp создает файл с правами 0600 - выставляем обычные права отчета
+        os.chmod(tmp_path, 0o644)
+    except BaseException:
+        _discard(tmp_path)
+        raise
+    return tmp_path
+
+
+def _discard(tmp_path: str):
+    try:
+        os.unlink(tmp_path)
+    except OSError:
+        pass
+
+
+def atomic_write_text(path: str, text: str):
+    """
+    Атомарно записывает текст в файл: во временный файл в том же каталоге,
+    затем переименование поверх целевого. Читатели видят либо старую,
+    либо новую версию файла целиком.
+    """
+    tmp_path = _write_temp(path, text)
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        _discard(tmp_path)
+        raise
+
+
+def lock_path(path: str) -> str:
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, f'.{name}.lock')
+
+
+def _lock_owner(lock: str) -> Optional[str]:
+    try:
+        with open(lock, encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _break_stale_lock(lock: str) -> bool:
+    """
+    Снимает блокировку старше STALE_LOCK_AGE. Файл блокировки сначала
+    переименовывается в уникальное имя - из нескольких ждущих это удается
+    одному, - и уже переименованный файл проверяется еще раз: если это
+    свежая блокировка, взятая сразу после чужого снятия, она возвращается
+    на место. Возвращает True, если блокировки больше нет или ее сняли.
+    """
+    try:
+        if time.time() - os.stat(lock).st_mtime <= STALE_LOCK_AGE:
+            return False
+        taken = f'{lock}.{uuid.uuid4().hex}.stale'
+        os.rename(lock, taken)
+    except FileNotFoundError:
+        return True
+    try:
+        if time.time() - os.stat(taken).st_mtime <= STALE_LOCK_AGE:
+            try:
+                os.link(taken, lock)
+            except OSError:
+                # Место уже занято или ссылки не поддерживаются: владелец
+                # увидит чужой файл блокировки и не удалит его при освобождении
+                pass
+    finally:
+        _discard(taken)
+    return True
+
+
+@contextmanager
+def report_lock(path: str, timeout: float = LOCK_TIMEOUT):
+    """
+    Блокировка отчета между процессами и рабочими местами: файл
+    блокировки создается с O_EXCL, что работает и на сетевых папках,
+    где fcntl/msvcrt ненадежны. В файл пишется метка владельца;
+    при освобождении удаляется только своя блокировка. Брошенную
+    упавшим процессом блокировку снимает _break_stale_lock.
+    При таймауте - TimeoutError.
+    """
+    lock = lock_path(path)
+    # Кто держит блокировку - для разбора зависших блокировок
+    owner = f"{socket.gethostname()} {os.getpid()} {uuid.uuid4().hex}\n"
+    deadline = time.monotonic() + timeout
+    delay = 0.001
+    while True:
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            break
+        except FileExistsError:
+            if _break_stale_lock(lock):
+                continue
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Отчет {os.path.basename(path)} заблокирован: {lock}") from None
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+    try:
+        os.write(fd, owner.encode('utf-8'))
+    except BaseException:
+        _discard(lock)
+        raise
+    finally:
+        os.close(fd)
+    try:
+        yield
+    finally:
+        if _lock_owner(lock) == owner:
+            _discard(lock)
+
+
+def version_stamp(text: Optional[str]) -> Optional[bytes]:
+    """Версия отчета - хеш его текста (None - отчета еще нет)"""
+    if text is None:
+        return None
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+def _read_current(path: str) -> Optional[str]:
+    try:
+        return report_archive.read_report(path)
+    except FileNotFoundError:
+        return None
+
+
+def section_key(furnace: str) -> str:
+    """
+    Ключ раздела печи. В отчете название печи может быть записано
+    в другом регистре (ПЕЧЬ 1), поэтому сравниваем без учета регистра.
+    """
+    return furnace.strip().upper()
+
+
+def furnace_order() -> Dict[str, int]:
+    """Позиции разделов печей из нормативов: ключ раздела -> номер по порядку"""
+    return {section_key(furnace): i for i, furnace in enumerate(furnace_names())}
+
+
+def furnace_sort_key(key: str, order: Optional[Dict[str, int]] = None):
+    """
+    Порядок разделов: печи из нормативов в их порядке, затем остальные по имени.
+    При сортировке многих разделов order (furnace_order()) передается готовым.
+    """
+    if order is None:
+        order = furnace_order()
+    index = order.get(key)
+    if index is not None:
+        return (0, index, key)
+    return (1, 0, key)
+
+
+class DailyReport:
+    """
+    Документ отчета за одну дату: шапка и разделы печей.
+    """
+    def __init__(self, header: str, sections: Optional[Dict[str, str]] = None):
+        self.header = header
+        self.sections = {section_key(furnace): text for furnace, text in (sections or {}).items()}
+        # Версия файла, из которого загружен отчет, и разделы, измененные после загрузки
+        self.base_version: Optional[bytes] = None
+        self.changed = set()
+
+    @classmethod
+    def new(cls, date_text: str) -> 'DailyReport':
+        """Пустой отчет за дату"""
+        return cls(render_header(date_text))
+
+    @classmethod
+    def parse(cls, text: str) -> 'DailyReport':
+        """Разбирает текст отчета на шапку и разделы печей"""
+        matches = list(SECTION_START.finditer(text))
+        if not matches:
+            return cls(text.rstrip('\n'))
+
+        header = text[:matches[0].start()].rstrip('\n')
+        sections = {}
+        for i, match in enumerate(matches):
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+            sections[section_key(match.group('furnace'))] = text[match.start():end].rstrip('\n')
+        return cls(header, sections)
+
+    @classmethod
+    def load(cls, path: str, date_text: str) -> 'DailyReport':
+        """
+        Читает отчет из файла (или из архива месяца, см. report_archive)
+        или создает новый, если отчета еще нет
+        """
+        text = _read_current(path)
+        if text is None:
+            return cls.new(date_text)
+        report = cls.parse(text)
+        report.base_version = version_stamp(text)
+        return report
+
+    def set_section(self, furnace: str, section: str):
+        """Вставляет или заменяет раздел печи"""
+        key = section_key(furnace)
+        self.sections[key] = section.rstrip('\n')
+        self.changed.add(key)
+
+    def set_run(self, run: FurnaceRun, metrics: RunMetrics):
+        """Формирует и вставляет раздел по данным прогона"""
+        self.set_section(run.furnace, render_section(run, metrics))
+
+    def render(self) -> str:
+        """Собирает полный текст отчета"""
+        parts = [self.header]
+        order = furnace_order()
+        parts.extend(self.sections[f] for f in
+                     sorted(self.sections, key=lambda f: furnace_sort_key(f, order)))
+        return '\n'.join(parts)
+
+    def rebase(self, text: Optional[str]):
+        """Накладывает измененные разделы на более новую версию отчета"""
+        if text is not None:
+            newer = self.parse(text)
+            for key in self.changed:
+                newer.sections[key] = self.sections[key]
+            self.header, self.sections = newer.header, newer.sections
+        self.base_version = version_stamp(text)
+
+    def save(self, path: str) -> str:
+        """
+        Атомарно сохраняет отчет в файл, объединяя его с изменениями,
+        сделанными другими процессами после загрузки. Возвращает
+        записанный текст.
+        """
+        for _ in range(SAVE_ATTEMPTS):
+            text = self.render()
+            tmp_path = _write_temp(path, text)
+            try:
+                with report_lock(path):
+                    current = _read_current(path)
+                    if version_stamp(current) == self.base_version:
+                        os.replace(tmp_path, path)
+                        tmp_path = None
+            finally:
+                if tmp_path is not None:
+                    _discard(tmp_path)
+            if tmp_path is None:
+                self.base_version = version_stamp(text)
+                self.changed.clear()
+                return text
+            # Файл изменили после загрузки - объединяем и пробуем снова
+            self.rebase(current)
+        raise ReportConflictError(f"Не удалось записать {path}: отчет постоянно изменяется")
+
+
+def save_reports(items: List[Tuple[str, DailyReport]]) -> int:
+    """
+    Сохраняет пачку отчетов [(путь, отчет)] с той же сверкой версий
+    под блокировкой, что и DailyReport.save, но с одним сбросом на диск
+    на всю пачку (os.sync, где он есть) вместо fsync каждого файла.
+    Отчет, измененный другим рабочим местом после загрузки, объединяется
+    с новой версией и сохраняется через save(). Возвращает число отчетов.
+    """
+    batch_sync = hasattr(os, 'sync')
+    pending = []
+    done = 0
+    try:
+        for path, report in items:
+            text = report.render()
+            pending.append((_write_temp(path, text, sync=not batch_sync), path, report, text))
+        if batch_sync:
+            os.sync()
+        for tmp_path, path, report, text in pending:
+            with report_lock(path):
+                current = _read_current(path)
+                replaced = version_stamp(current) == report.base_version
+                if replaced:
+                    os.replace(tmp_path, path)
+            done += 1
+            if replaced:
+                report.base_version = version_stamp(text)
+                report.changed.clear()
+            else:
+                _discard(tmp_path)
+                report.rebase(current)
+                report.save(path)
+    finally:
+        for tmp_path, *_ in pending[done:]:
+            _discard(tmp_path)
+    return len(pending)
+
+
+def update_daily_report(path: str, run: FurnaceRun, metrics: RunMetrics) -> DailyReport:
+    """Обновляет раздел печи в файле отчета за дату прогона"""
+    report = DailyReport.load(path, run.date)
+    report.set_run(run, metrics)
+    report.save(path)
+    return report
@@ -0,0 +1,167 @@
+"""
+Журнал черновика формы.
+
+Каждое изменение поля формы записывается в журнал маленькой записью
+в конец файла (JSON Lines), поэтому введенное переживает падение
+приложения или перезагрузку компьютера. Запись в файл и fsync
+выполняются фоновым потоком раз в interval секунд пачкой: изменения
+между сбросами копятся в памяти, и для каждого поля хранится только
+последнее значение - ввод не ждет диска.
+
+При запуске журнал воспроизводится и восстанавливает поля. Запись
+{"clear": true} (после отправки отчета) обнуляет черновик. Когда
+записей становится много, журнал сжимается: файл атомарно заменяется
+снимком текущего состояния. Оборванная при сбое последняя строка
+при воспроизведении пропускается, а журнал сразу сжимается, чтобы
+следующая запись не приклеилась к обрывку.
+"""
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+from daily_report import atomic_write_text
+
+DEFAULT_JOURNAL_PATH = 'draft.jsonl'
+
+# После скольких записей журнал сжимается в снимок
+COMPACT_AFTER = 500
+
+
+class DraftJournal:
+    def __init__(self, path: str = DEFAULT_JOURNAL_PATH, interval: float = 1.0,
+                 compact_after: int = COMPACT_AFTER):
+        self.path = path
+        self.interval = interval
+        self.compact_after = compact_after
+        self.state: Dict[str, str] = {}
+        self._entries = 0
+        self._buffer: Dict[str, str] = {}
+        self._cleared = False
+        # Дозапись не удалась - следующий сброс пишет полный снимок
+        self._needs_snapshot = False
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def restore(self) -> Dict[str, str]:
+        """Воспроизводит журнал и возвращает значения полей черновика"""
+        state: Dict[str, str] = {}
+        entries = 0
+        damaged = False
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    # Строка без перевода строки оборвана при сбое, даже если
+                    # это целый JSON: дозапись продолжила бы ее
+                    damaged = damaged or not line.endswith('\n')
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        damaged = True
+                        continue
+                    if not isinstance(entry, dict):
+                        damaged = True
+                        continue
+                    entries += 1
+                    if entry.get('clear'):
+                        state.clear()
+                    elif 'f' in entry:
+                        state[entry['f']] = entry.get('v', '')
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.state = state
+            self._entries = entries
+        if damaged or entries > len(state):
+            self.compact()
+        return dict(state)
+
+    def start(self):
+        """Запускает фоновый сброс журнала"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker, name='DraftJournal', daemon=True)
+            self._thread.start()
+
+    def record(self, field: str, value: str):
+        """Запоминает новое значение поля (без обращения к диску)"""
+        with self._lock:
+            if self.state.get(field, '') == value and field not in self._buffer:
+                return
+            self.state[field] = value
+            self._buffer[field] = value
+
+    def clear(self):
+        """Отмечает, что черновик отправлен и больше не нужен"""
+        with self._lock:
+            self.state.clear()
+            self._buffer.clear()
+            self._cleared = True
+
+    def flush(self):
+        """Дописывает накопленные изменения в журнал и сбрасывает их на диск"""
+        with self._io_lock:
+            with self._lock:
+                if not self._buffer and not self._cleared and not self._needs_snapshot:
+                    return
+                lines = []
+                if self._cleared:
+                    lines.append(json.dumps({'clear': True}))
+                lines.extend(json.dumps({'f': field, 'v': value}, ensure_ascii=False)
+                             for field, value in self._buffer.items())
+                self._buffer.clear()
+                self._cleared = False
+                self._entries += len(lines)
+                compact = self._entries > self.compact_after or self._needs_snapshot
+            if compact:
+                self._compact_locked()
+                return
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError:
+                with self._lock:
+                    self._needs_snapshot = True
+                raise
+
+    def compact(self):
+        """Заменяет журнал снимком текущего состояния"""
+        with self._io_lock:
+            with self._lock:
+                self._buffer.clear()
+                self._cleared = False
+            self._compact_locked()
+
+    def _compact_locked(self):
+        with self._lock:
+            snapshot = dict(self.state)
+            self._entries = len(snapshot)
+        text = ''.join(json.dumps({'f': field, 'v': value}, ensure_ascii=False) + '\n'
+                       for field, value in snapshot.items())
+        try:
+            atomic_write_text(self.path, text)
+        except OSError:
+            with self._lock:
+                self._needs_snapshot = True
+            raise
+        with self._lock:
+            self._needs_snapshot = False
+
+    def close(self):
+        """Останавливает фоновый сброс и дописывает оставшееся"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _worker(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except OSError:
+                # Повторим при следующем сбросе
+                pass
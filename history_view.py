@@ -0,0 +1,238 @@
+"""
+Экран истории прогонов.
+
+Список всех прогонов из хранилища: дата, печь, времена этапов
+и отклонения от нормы. Фильтр по печи и диапазону дат, сортировка
+по любой колонке. Список построен на RecycleView: виджеты создаются
+только для видимых строк, а данные подгружаются страницами
+(RunStore.page, выборка по ключу без OFFSET) по мере прокрутки вниз,
+поэтому экран открывается сразу при любом объеме архива.
+Загружается лениво при первом открытии истории.
+"""
+from kivy.factory import Factory
+from kivy.lang import Builder
+from kivy.properties import NumericProperty, StringProperty
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.button import Button
+from kivy.uix.label import Label
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.spinner import Spinner
+from kivy.uix.textinput import TextInput
+
+import metrics
+from norms_book import furnace_names
+from report_core import format_percent, format_time, parse_date
+from run_store import RunStore
+
+# Сколько прогонов подгружается за раз
+PAGE_SIZE = 100
+
+ALL_FURNACES = 'Все печи'
+
+# Подпись -> колонка хранилища для сортировки (все из RunStore.SORT_COLUMNS,
+# с индексами)
+SORT_OPTIONS = {
+    'Дата': 'run_date',
+    'Печь': 'furnace',
+    'Этап 1': 'stage1_time',
+    'Этап 2': 'stage2_time',
+    'Перерыв': 'break_time',
+    'Общее время': 'total_time',
+    'Откл. этапа 1': 'stage1_dev',
+    'Откл. этапа 2': 'stage2_dev',
+    'Откл. перерыва': 'break_dev',
+    'Откл. общего': 'total_dev',
+}
+
+COLUMNS = ('run_date', 'furnace', 'stage1_time', 'stage2_time', 'break_time', 'total_time',
+           'stage1_dev', 'stage2_dev', 'break_dev', 'total_dev')
+
+# Начинать загрузку следующей страницы, когда до конца списка осталось меньше этой доли
+LOAD_THRESHOLD = 0.1
+
+HISTORY_KV = '''
+<HistoryRow>:
+    size_hint_y: None
+    height: 30
+    canvas.before:
+        Color:
+            rgba: (0.97, 0.97, 0.97, 1) if self.index % 2 else (1, 1, 1, 1)
+        Rectangle:
+            pos: self.pos
+            size: self.size
+    HistoryCell:
+        text: root.date
+        size_hint_x: 0.8
+    HistoryCell:
+        text: root.furnace
+        size_hint_x: 0.6
+    HistoryCell:
+        text: root.stage1
+    HistoryCell:
+        text: root.stage2
+    HistoryCell:
+        text: root.pause
+    HistoryCell:
+        text: root.total
+
+<HistoryCell@Label>:
+    color: (0.2, 0.2, 0.2, 1)
+    font_size: '12sp'
+    text_size: self.size
+    halign: 'left'
+    valign: 'middle'
+
+<HistoryHeader@Label>:
+    color: (0.2, 0.6, 0.8, 1)
+    font_size: '12sp'
+    bold: True
+    text_size: self.size
+    halign: 'left'
+    valign: 'middle'
+
+<HistoryList>:
+    viewclass: 'HistoryRow'
+    RecycleBoxLayout:
+        orientation: 'vertical'
+        default_size: None, 30
+        default_size_hint: 1, None
+        size_hint_y: None
+        height: self.minimum_height
+'''
+
+Builder.load_string(HISTORY_KV, filename='history_view.kv')
+
+
+class HistoryRow(RecycleDataViewBehavior, BoxLayout):
+    """Строка списка (переиспользуется RecycleView для разных прогонов)"""
+    # Свойство, а не атрибут класса: иначе полоса фона не перерисуется,
+    # когда RecycleView отдаст строку другому прогону
+    index = NumericProperty(0)
+    date = StringProperty('')
+    furnace = StringProperty('')
+    stage1 = StringProperty('')
+    stage2 = StringProperty('')
+    pause = StringProperty('')
+    total = StringProperty('')
+
+    def refresh_view_attrs(self, rv, index, data):
+        self.index = index
+        return super().refresh_view_attrs(rv, index, data)
+
+
+class HistoryList(RecycleView):
+    pass
+
+
+def _stage_text(minutes, deviation) -> str:
+    sign = '+' if round(deviation, 2) > 0 else ''
+    return f"{format_time(minutes)} ({sign}{format_percent(deviation)}%)"
+
+
+def row_data(row) -> dict:
+    """Данные строки списка из строки хранилища (колонки COLUMNS)"""
+    run_date, furnace, s1, s2, pause, total, d1, d2, dp, dt = row
+    return {
+        'date': f"{run_date[8:10]}.{run_date[5:7]}.{run_date[:4]}",
+        'furnace': furnace,
+        'stage1': _stage_text(s1, d1),
+        'stage2': _stage_text(s2, d2),
+        'pause': _stage_text(pause, dp),
+        'total': _stage_text(total, dt),
+    }
+
+
+class HistoryView(BoxLayout):
+    """
+    Экран истории: панель фильтров, заголовок колонок и список.
+    Фильтры применяются кнопкой 'Показать'; список начинается заново
+    с первой страницы.
+    """
+    def __init__(self, store: RunStore, **kwargs):
+        super().__init__(orientation='vertical', spacing=5, **kwargs)
+        self.store = store
+        self._cursor = None
+        self._has_more = False
+        self._query = {}
+
+        filters = BoxLayout(size_hint_y=None, height=40, spacing=5)
+        self.furnace_spinner = Spinner(text=ALL_FURNACES, values=[ALL_FURNACES] + furnace_names())
+        self.start_input = TextInput(hint_text='с дд.мм.гггг', multiline=False)
+        self.end_input = TextInput(hint_text='по дд.мм.гггг', multiline=False)
+        filters.add_widget(self.furnace_spinner)
+        filters.add_widget(self.start_input)
+        filters.add_widget(self.end_input)
+        self.add_widget(filters)
+
+        sorting = BoxLayout(size_hint_y=None, height=40, spacing=5)
+        self.sort_spinner = Spinner(text='Дата', values=list(SORT_OPTIONS))
+        self.direction_button = Button(text='по убыванию', size_hint_x=0.6)
+        self.direction_button.bind(on_press=self.toggle_direction)
+        show_button = Button(text='Показать', size_hint_x=0.6)
+        show_button.bind(on_press=self.apply_filters)
+        sorting.add_widget(self.sort_spinner)
+        sorting.add_widget(self.direction_button)
+        sorting.add_widget(show_button)
+        self.add_widget(sorting)
+
+        self.status_label = Label(size_hint_y=None, height=25, color=(0.4, 0.4, 0.4, 1))
+        self.add_widget(self.status_label)
+
+        header = BoxLayout(size_hint_y=None, height=25)
+        for title, weight in (('Дата', 0.8), ('Печь', 0.6), ('Этап 1', 1), ('Этап 2', 1),
+                              ('Перерыв', 1), ('Общее', 1)):
+            header.add_widget(Factory.HistoryHeader(text=title, size_hint_x=weight))
+        self.add_widget(header)
+
+        self.list = HistoryList()
+        self.list.bind(scroll_y=self.on_scroll)
+        self.add_widget(self.list)
+
+        self.apply_filters()
+
+    @property
+    def descending(self) -> bool:
+        return self.direction_button.text == 'по убыванию'
+
+    def toggle_direction(self, instance):
+        self.direction_button.text = 'по возрастанию' if self.descending else 'по убыванию'
+        self.apply_filters()
+
+    def apply_filters(self, *args):
+        """Применяет фильтры и сортировку, загружает первую страницу"""
+        try:
+            start = parse_date(self.start_input.text) if self.start_input.text.strip() else None
+            end = parse_date(self.end_input.text) if self.end_input.text.strip() else None
+        except ValueError as e:
+            self.status_label.text = str(e)
+            return
+        furnace = self.furnace_spinner.text
+        self._query = {
+            'start': start,
+            'end': end,
+            'furnace': None if furnace == ALL_FURNACES else furnace,
+        }
+        self._cursor = None
+        self._has_more = True
+        self.list.data = []
+        self.list.scroll_y = 1
+        total = self.store.count(**self._query)
+        self.status_label.text = f"Найдено прогонов: {total}"
+        self.load_page()
+
+    def load_page(self):
+        """Подгружает следующую страницу в конец списка"""
+        if not self._has_more:
+            return
+        with metrics.span('history_page'):
+            rows, self._cursor = self.store.page(
+                COLUMNS, order=SORT_OPTIONS[self.sort_spinner.text], descending=self.descending,
+                after=self._cursor, limit=PAGE_SIZE, **self._query)
+            self._has_more = self._cursor is not None
+            self.list.data.extend(row_data(row) for row in rows)
+
+    def on_scroll(self, instance, scroll_y):
+        # scroll_y = 0 - список прокручен до конца
+        if scroll_y <= LOAD_THRESHOLD:
+            self.load_page()
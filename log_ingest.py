@@ -0,0 +1,344 @@
+"""
+Загрузка прогонов из журналов событий контроллеров печей.
+
+Демон следит за каталогом, куда контроллеры выгружают журналы (CSV или
+текст), дочитывает новые строки, выделяет события включения/выключения
+программ по каждой печи и собирает из них прогоны
+(Программа 1 ВКЛ -> ВЫКЛ -> Программа 2 ВКЛ -> ВЫКЛ). Готовые прогоны
+рассчитываются так же, как в generate_report, сохраняются в хранилище
+и в отчет за дату.
+
+Формат строки журнала (разделитель ';', ',' или табуляция):
+    2025-03-22 15:15:03;Печь 1;Программа 1;ВКЛ
+Дата - гггг-мм-дд или дд.мм.гггг, печь - 'Печь N' или номер,
+программа - 'Программа N', 'PN' или номер, состояние - ВКЛ/ВЫКЛ, ON/OFF, 1/0.
+
+Позиции чтения хранятся в файле контрольной точки по идентификатору
+файла (устройство + inode), поэтому каждая строка читается один раз,
+ротация (переименование, усечение) обрабатывается, а демон можно
+перезапускать в любой момент. Кроме файлов по маске читаются их
+ротированные копии (x.csv.1, x.csv-20250322): после переименования
+журнал дочитывается до конца под новым именем. Вместе с позицией
+хранятся время изменения и начало файла; если inode достался новому
+файлу (начало не совпадает) или файл стал короче позиции, он читается
+с начала.
+
+Пример:
+    python log_ingest.py /mnt/controllers -o reports/
+"""
+import argparse
+import fnmatch
+import glob
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import norms_book
+import report_core
+from daily_report import DailyReport, atomic_write_text
+from report_core import FurnaceRun
+from run_store import DEFAULT_DB_PATH, RunStore
+
+DEFAULT_CHECKPOINT = 'ingest_checkpoint.json'
+
+# Сколько первых байт файла хранится для проверки, что inode не занят другим файлом
+HEAD_SIZE = 64
+
+# Суффикс ротированной копии журнала: x.csv.1, x.csv-20250322
+ROTATED_SUFFIX = re.compile(r'[.-]\d+$')
+
+EVENT_PATTERN = re.compile(
+    r'^\s*(?P<date>\d{4}-\d{2}-\d{2}|\d{2}\.\d{2}\.\d{4})[ T](?P<time>\d{2}:\d{2})(?::\d{2})?'
+    r'\s*[;,\t]\s*(?:Печь\s*)?(?P<furnace>\d+)'
+    r'\s*[;,\t]\s*(?:Программа\s*|P)?(?P<program>[12])'
+    r'\s*[;,\t]\s*(?P<state>ВКЛ|ВЫКЛ|ON|OFF|1|0)\s*$',
+    re.IGNORECASE)
+
+ON_STATES = {'вкл', 'on', '1'}
+
+
+@dataclass
+class ProgramEvent:
+    """Включение или выключение программы на печи"""
+    when: datetime
+    furnace: str
+    program: int
+    on: bool
+
+
+def parse_event(line: str) -> Optional[ProgramEvent]:
+    """Разбирает строку журнала; строки другого формата пропускаются"""
+    match = EVENT_PATTERN.match(line)
+    if match is None:
+        return None
+    date_text = match.group('date')
+    date_format = '%Y-%m-%d' if '-' in date_text else '%d.%m.%Y'
+    return ProgramEvent(
+        when=datetime.strptime(f"{date_text} {match.group('time')}", f"{date_format} %H:%M"),
+        furnace=f"Печь {int(match.group('furnace'))}",
+        program=int(match.group('program')),
+        on=match.group('state').lower() in ON_STATES,
+    )
+
+
+# Ожидаемая последовательность событий прогона: (программа, включение)
+RUN_SEQUENCE = ((1, True), (1, False), (2, True), (2, False))
+
+
+class RunAssembler:
+    """
+    Собирает прогоны из потока событий, отдельно по каждой печи.
+    Включение Программы 1 всегда начинает новый прогон; события не по
+    порядку отбрасывают незавершенный прогон.
+    """
+    def __init__(self, state: Optional[Dict[str, List[str]]] = None):
+        # печь -> отметки времени уже полученных событий прогона (ISO)
+        self.pending: Dict[str, List[str]] = {k: list(v) for k, v in (state or {}).items()}
+
+    def state(self) -> Dict[str, List[str]]:
+        return {k: list(v) for k, v in self.pending.items() if v}
+
+    def feed(self, event: ProgramEvent) -> Optional[FurnaceRun]:
+        """Учитывает событие; возвращает прогон, если он завершен"""
+        step = (event.program, event.on)
+        if step == RUN_SEQUENCE[0]:
+            self.pending[event.furnace] = [event.when.isoformat()]
+            return None
+
+        marks = self.pending.get(event.furnace)
+        if not marks or RUN_SEQUENCE[len(marks)] != step:
+            self.pending.pop(event.furnace, None)
+            return None
+
+        marks.append(event.when.isoformat())
+        if len(marks) < len(RUN_SEQUENCE):
+            return None
+
+        del self.pending[event.furnace]
+        times = [datetime.fromisoformat(mark) for mark in marks]
+        # Отметки - минуты от полуночи даты включения Программы 1,
+        # так прогоны дольше суток не теряют дни
+        midnight = datetime.combine(times[0].date(), datetime.min.time())
+        minutes = [int((t - midnight).total_seconds()) // 60 for t in times]
+        return FurnaceRun(report_core.format_date(times[0].date()), event.furnace,
+                          *minutes, notifications='')
+
+    def feed_all(self, events: Iterable[ProgramEvent]) -> Iterator[FurnaceRun]:
+        for event in events:
+            run = self.feed(event)
+            if run is not None:
+                yield run
+
+
+def file_id(stat: os.stat_result) -> str:
+    """Идентификатор файла, не меняющийся при переименовании (ротации)"""
+    return f"{stat.st_dev}:{stat.st_ino}"
+
+
+def file_head(path: str, size: int = HEAD_SIZE) -> str:
+    """Первые байты файла (hex) - отпечаток, отличающий файлы с одним inode"""
+    with open(path, 'rb') as f:
+        return f.read(size).hex()
+
+
+def read_new_lines(path: str, offset: int):
+    """
+    Читает полные строки файла начиная с offset.
+    Незавершенная последняя строка остается до следующего чтения.
+    Возвращает (строки, новая позиция).
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b'\n') + 1
+    if end == 0:
+        return [], offset
+    text = data[:end].decode('utf-8', errors='replace')
+    return text.splitlines(), offset + end
+
+
+class LogIngestor:
+    """
+    Инкрементальная загрузка журналов из каталога.
+    poll() обрабатывает все новые строки и возвращает число прогонов.
+    """
+    def __init__(self, folder: str, pattern: str = '*.csv',
+                 checkpoint_path: str = DEFAULT_CHECKPOINT,
+                 output_dir: str = '.', store: Optional[RunStore] = None):
+        self.folder = folder
+        self.pattern = pattern
+        self.checkpoint_path = checkpoint_path
+        self.output_dir = output_dir
+        self.store = store
+        # идентификатор файла -> {'offset', 'mtime', 'head'}
+        self.positions: Dict[str, Dict] = {}
+        self.assembler = RunAssembler()
+        self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        self.positions = data.get('files', {})
+        # Прежний формат: только позиции, без времени изменения и начала файла
+        for key, offset in data.get('offsets', {}).items():
+            self.positions.setdefault(key, {'offset': int(offset), 'mtime': None, 'head': ''})
+        self.assembler = RunAssembler(data.get('pending'))
+
+    def _save_checkpoint(self):
+        data = {'files': self.positions, 'pending': self.assembler.state()}
+        atomic_write_text(self.checkpoint_path, json.dumps(data, ensure_ascii=False, indent=1))
+
+    def _is_log(self, name: str) -> bool:
+        """Журнал по маске или его ротированная копия"""
+        if fnmatch.fnmatch(name, self.pattern):
+            return True
+        rotated = ROTATED_SUFFIX.search(name)
+        return rotated is not None and fnmatch.fnmatch(name[:rotated.start()], self.pattern)
+
+    def _files(self):
+        """Журналы каталога от старых к новым (ротированные файлы читаются первыми)"""
+        files = {}
+        for path in glob.glob(os.path.join(self.folder, self.pattern + '*')):
+            if not self._is_log(os.path.basename(path)):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            # Жесткие ссылки на один файл читаются один раз
+            files[file_id(stat)] = (stat.st_mtime, path, stat)
+        return sorted(files.values())
+
+    def _start_offset(self, path: str, stat: os.stat_result, position: Optional[Dict]) -> int:
+        """Позиция, с которой дочитывать файл; 0 - если это уже другой файл"""
+        if position is None:
+            return 0
+        offset = position['offset']
+        if stat.st_size < offset:
+            # Файл усечен и пишется заново
+            return 0
+        head = position['head']
+        if head and file_head(path, len(head) // 2) != head:
+            # inode удаленного журнала достался новому файлу
+            return 0
+        return offset
+
+    def poll(self) -> int:
+        """
+        Дочитывает новые строки всех журналов и обрабатывает готовые прогоны.
+        При ошибке незавершенные прогоны возвращаются к контрольной точке,
+        чтобы повторное чтение тех же строк не сбило их.
+        """
+        pending = self.assembler.state()
+        try:
+            return self._poll()
+        except Exception:
+            self.assembler = RunAssembler(pending)
+            raise
+
+    def _poll(self) -> int:
+        runs = []
+        seen = {}
+        changed = False
+        for _, path, stat in self._files():
+            key = file_id(stat)
+            position = self.positions.get(key)
+            if (position is not None and position['mtime'] == stat.st_mtime_ns
+                    and position['offset'] == stat.st_size):
+                # Файл прочитан целиком и с тех пор не менялся
+                seen[key] = position
+                continue
+            try:
+                offset = self._start_offset(path, stat, position)
+                lines, new_offset = read_new_lines(path, offset)
+                head = file_head(path, min(new_offset, HEAD_SIZE))
+            except FileNotFoundError:
+                continue
+            events = (parse_event(line) for line in lines)
+            runs.extend(self.assembler.feed_all(e for e in events if e is not None))
+            seen[key] = {'offset': new_offset, 'mtime': stat.st_mtime_ns, 'head': head}
+            changed = changed or seen[key] != position
+
+        if runs:
+            self.process_runs(runs)
+        # Позиции удаленных файлов больше не нужны
+        if changed or seen.keys() != self.positions.keys():
+            self.positions = seen
+            self._save_checkpoint()
+        return len(runs)
+
+    def process_runs(self, runs: List[FurnaceRun]):
+        """Рассчитывает прогоны, сохраняет их в хранилище и в отчеты за даты"""
+        results = []
+        for run in runs:
+            try:
+                results.append((run, norms_book.evaluate(run)))
+            except ValueError as e:
+                print(f"Пропущен прогон {run.furnace} за {run.date}: {e}", file=sys.stderr)
+
+        reports: Dict[str, DailyReport] = {}
+        for run, metrics in results:
+            path = os.path.join(self.output_dir, report_core.report_filename(run.date))
+            if path not in reports:
+                reports[path] = DailyReport.load(path, run.date)
+            reports[path].set_run(run, metrics)
+        for path, report in reports.items():
+            report.save(path)
+
+        if self.store is not None and results:
+            self.store.save_many(results)
+
+    def run_forever(self, interval: float = 2.0):
+        """
+        Опрашивает каталог до остановки. Ошибка опроса (недоступен сетевой
+        диск, занято хранилище) не останавливает демон: контрольная точка
+        сохраняется только после обработки, и строки будут прочитаны
+        повторно на следующем опросе.
+        """
+        while True:
+            try:
+                count = self.poll()
+            except Exception as e:
+                print(f"{datetime.now():%H:%M:%S} ошибка опроса: {e!r}", file=sys.stderr)
+            else:
+                if count:
+                    print(f"{datetime.now():%H:%M:%S} загружено прогонов: {count}")
+            time.sleep(interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Загрузка прогонов из журналов контроллеров печей')
+    parser.add_argument('folder', help='каталог с журналами контроллеров')
+    parser.add_argument('--pattern', default='*.csv', help='маска файлов журналов (по умолчанию *.csv)')
+    parser.add_argument('-o', '--output-dir', default='.', help='каталог для отчетов')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH,
+                        help=f'хранилище прогонов (по умолчанию {DEFAULT_DB_PATH})')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT,
+                        help=f'файл контрольной точки (по умолчанию {DEFAULT_CHECKPOINT})')
+    parser.add_argument('--interval', type=float, default=2.0, help='период опроса в секундах')
+    parser.add_argument('--once', action='store_true', help='обработать новые строки и выйти')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    with RunStore(args.db) as store:
+        ingestor = LogIngestor(args.folder, args.pattern, args.checkpoint, args.output_dir, store)
+        if args.once:
+            print(f"Загружено прогонов: {ingestor.poll()}")
+        else:
+            try:
+                ingestor.run_forever(args.interval)
+            except KeyboardInterrupt:
+                pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""
+Встроенные замеры этапов работы и экспорт метрик в локальный файл.
+
+Сбор выключен по умолчанию. Включается переменной окружения
+T2MD_METRICS=<путь к файлу> или вызовом enable(). Формат файла
+определяется расширением: .jsonl - JSON Lines (одна метрика на строку),
+иначе - текстовый формат Prometheus. Файл перезаписывается атомарно
+фоновым потоком раз в T2MD_METRICS_INTERVAL секунд (по умолчанию 10),
+если метрики изменились, и при завершении процесса; агент мониторинга
+читает его с диска. Замеры в потоке интерфейса файл не пишут.
+
+Замеры:
+    with metrics.span('render'):
+        ...
+    metrics.count('reports')
+
+В выключенном состоянии span() возвращает общий пустой контекст,
+а count() сразу выходит - накладные расходы сводятся к одной проверке.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+# Границы корзин гистограмм длительности, секунды
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PREFIX = 't2md'
+
+
+class _Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Registry:
+    """Накопленные значения метрик и их периодическая выгрузка в файл"""
+    def __init__(self, path: str, interval: float):
+        self.path = path
+        self.interval = interval
+        self.histograms: Dict[str, _Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.changed = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._worker, name='Metrics', daemon=True)
+        self._thread.start()
+
+    def observe(self, phase: str, seconds: float):
+        with self.lock:
+            hist = self.histograms.get(phase)
+            if hist is None:
+                hist = self.histograms[phase] = _Histogram()
+            hist.observe(seconds)
+            self.changed = True
+
+    def count(self, name: str, value: int):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            self.changed = True
+
+    def _worker(self):
+        while not self._stop.wait(self.interval):
+            if self.changed:
+                self.export()
+
+    def stop(self):
+        """Останавливает фоновую выгрузку"""
+        self._stop.set()
+        self._thread.join()
+
+    def export(self):
+        # daily_report тянет за собой нормативы и архив отчетов; метрики
+        # импортируются первым экраном, поэтому загружаем его при выгрузке
+        from daily_report import atomic_write_text
+
+        with self.lock:
+            self.changed = False
+            if self.path.endswith('.jsonl'):
+                text = self._jsonl()
+            else:
+                text = self._prometheus()
+        try:
+            atomic_write_text(self.path, text)
+        except OSError:
+            # Метрики не должны мешать основной работе
+            pass
+
+    def _prometheus(self) -> str:
+        lines: List[str] = []
+        name = f'{PREFIX}_phase_duration_seconds'
+        lines.append(f'# HELP {name} Длительность этапов работы')
+        lines.append(f'# TYPE {name} histogram')
+        for phase, hist in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, value in zip(BUCKETS + (float('inf'),), hist.counts):
+                cumulative += value
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{{phase="{phase}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{phase="{phase}"}} {hist.sum:.6f}')
+            lines.append(f'{name}_count{{phase="{phase}"}} {hist.count}')
+        for counter, value in sorted(self.counters.items()):
+            lines.append(f'# TYPE {PREFIX}_{counter}_total counter')
+            lines.append(f'{PREFIX}_{counter}_total {value}')
+        return '\n'.join(lines) + '\n'
+
+    def _jsonl(self) -> str:
+        timestamp = time.time()
+        records = []
+        for phase, hist in sorted(self.histograms.items()):
+            records.append({
+                'ts': timestamp, 'type': 'histogram', 'phase': phase,
+                'buckets': dict(zip([str(b) for b in BUCKETS] + ['+Inf'], hist.counts)),
+                'sum': hist.sum, 'count': hist.count,
+            })
+        for counter, value in sorted(self.counters.items()):
+            records.append({'ts': timestamp, 'type': 'counter', 'name': counter, 'value': value})
+        return ''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records)
+
+
+class _Span:
+    __slots__ = ('registry', 'phase', 'start')
+
+    def __init__(self, registry: _Registry, phase: str):
+        self.registry = registry
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.phase, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+_registry: Optional[_Registry] = None
+_atexit_registered = False
+
+
+def enable(path: str, interval: float = 10.0):
+    """Включает сбор метрик с выгрузкой в файл path"""
+    global _registry, _atexit_registered
+    if _registry is not None:
+        disable()
+    if not _atexit_registered:
+        atexit.register(export)
+        _atexit_registered = True
+    _registry = _Registry(path, interval)
+
+
+def disable():
+    """Выгружает накопленное и выключает сбор метрик"""
+    global _registry
+    registry = _registry
+    _registry = None
+    if registry is not None:
+        registry.stop()
+        registry.export()
+
+
+def enabled() -> bool:
+    return _registry is not None
+
+
+def span(phase: str):
+    """Контекст замера длительности этапа"""
+    registry = _registry
+    if registry is None:
+        return _NULL_SPAN
+    return _Span(registry, phase)
+
+
+def observe(phase: str, seconds: float):
+    """Добавляет уже измеренную длительность этапа"""
+    registry = _registry
+    if registry is not None:
+        registry.observe(phase, seconds)
+
+
+def count(name: str, value: int = 1):
+    """Увеличивает счетчик (reports, errors, retries, ...)"""
+    registry = _registry
+    if registry is not None:
+        registry.count(name, value)
+
+
+def export():
+    """Немедленно выгружает метрики в файл"""
+    registry = _registry
+    if registry is not None:
+        registry.export()
+
+
+if os.environ.get('T2MD_METRICS'):
+    enable(os.environ['T2MD_METRICS'], float(os.environ.get('T2MD_METRICS_INTERVAL', '10')))
@@ -0,0 +1,269 @@
+"""
+Нормативы печей из внешнего файла с версиями по датам.
+
+Файл Нормативы.json (рядом с модулем или по пути из переменной окружения
+T2MD_NORMS) содержит версии нормативов с датами начала действия.
+Каждый прогон оценивается по версии, действующей на его дату; версия
+перечисляет все печи, работающие с этой даты:
+
+    {
+      "stages": {"цикл1": ["prog1_start", "prog1_end"], ...},
+      "versions": [
+        {"from": "01.01.1900",
+         "furnaces": {"Печь 1": {"цикл1": "08:30", "цикл2": "03:30", ...}}},
+        {"from": "01.06.2025",
+         "furnaces": {...}}
+      ]
+    }
+
+Этапы задаются как промежутки между отметками прогона (prog1_start,
+prog1_end, prog2_start, prog2_end); кроме обязательных цикл1, цикл2,
+перерыв и общее можно объявить свои: они выводятся в аналитике раздела
+печи и сохраняются в хранилище прогонов. Печь может переопределить этапы
+ключом "stages". Норматив - минуты числом или строка ЧЧ:ММ.
+
+Число печей не ограничено, а число программ - нет: у прогона всегда две
+программы и перерыв между ними (форма ввода, журналы контроллеров,
+хранилище и шаблон построены на этих четырех отметках). Этапы из "stages"
+делят эти отметки по-другому, но не добавляют новых программ.
+
+Каждая версия компилируется в таблицу FurnaceNorms по печам, выбор
+версии по дате - двоичный поиск. Файл перечитывается после изменения
+(проверка не чаще раза в RELOAD_INTERVAL секунд); если новая версия
+файла содержит ошибку, продолжают действовать прежние нормативы.
+Без файла действуют встроенные нормативы report_core.NORMS.
+"""
+import json
+import logging
+import os
+import time
+from bisect import bisect_right
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from report_core import (MARKS, NORMS, STAGE_SPANS, FurnaceRun, RunMetrics,
+                         compute_metrics, format_date, parse_date)
+
+log = logging.getLogger(__name__)
+
+NORMS_PATH = os.environ.get('T2MD_NORMS') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'Нормативы.json')
+
+# Как часто (в секундах) проверять, не изменился ли файл нормативов
+RELOAD_INTERVAL = 1.0
+
+
+class NormsError(ValueError):
+    """Ошибка в файле нормативов"""
+
+
+class FurnaceNorms(dict):
+    """
+    Нормативы одной печи в одной версии: этап -> минуты.
+    spans - скомпилированные этапы (этап, индекс начала, индекс конца)
+    по порядку отметок MARKS для compute_metrics.
+    """
+    __slots__ = ('spans',)
+
+    def __init__(self, values: Dict[str, int], spans: Tuple[Tuple[str, int, int], ...]):
+        super().__init__(values)
+        self.spans = spans
+
+
+def _minutes(value, where: str) -> int:
+    if isinstance(value, bool):
+        raise NormsError(f"{where}: норматив должен быть числом минут или ЧЧ:ММ")
+    if isinstance(value, int):
+        minutes = value
+    elif isinstance(value, str):
+        hours, sep, mins = value.strip().partition(':')
+        if (not sep or not hours.isdigit() or not mins.isdigit()
+                or len(mins) != 2 or int(mins) > 59):
+            raise NormsError(f"{where}: норматив должен быть числом минут или ЧЧ:ММ")
+        # Нормативы бывают длиннее суток, поэтому часы не ограничены 23
+        minutes = int(hours) * 60 + int(mins)
+    else:
+        raise NormsError(f"{where}: норматив должен быть числом минут или ЧЧ:ММ")
+    if minutes <= 0:
+        raise NormsError(f"{where}: норматив должен быть больше нуля")
+    return minutes
+
+
+def _compile_spans(stages: Dict, where: str) -> Tuple[Tuple[str, int, int], ...]:
+    spans = []
+    for stage, bounds in stages.items():
+        if (not isinstance(bounds, (list, tuple)) or len(bounds) != 2
+                or any(mark not in MARKS for mark in bounds)):
+            raise NormsError(f"{where}: этап {stage} задается парой отметок из {', '.join(MARKS)}")
+        start, end = (MARKS.index(mark) for mark in bounds)
+        if start >= end:
+            raise NormsError(f"{where}: этап {stage} заканчивается раньше, чем начинается")
+        spans.append((stage, start, end))
+    return tuple(spans)
+
+
+def compile_furnace(values: Dict, stages: Dict, where: str) -> FurnaceNorms:
+    """Проверяет и компилирует нормативы одной печи"""
+    stages = {**stages, **values.get('stages', {})}
+    norms = {stage: _minutes(value, f"{where}, {stage}")
+             for stage, value in values.items() if stage != 'stages'}
+    missing = [stage for stage in stages if stage not in norms]
+    if missing:
+        raise NormsError(f"{where}: нет нормативов для этапов {', '.join(missing)}")
+    unknown = [stage for stage in norms if stage not in stages]
+    if unknown:
+        raise NormsError(f"{where}: этапы {', '.join(unknown)} не объявлены в stages")
+    return FurnaceNorms(norms, _compile_spans(stages, where))
+
+
+class NormsBook:
+    """
+    Все версии нормативов, упорядоченные по дате начала действия.
+    for_date() возвращает словарь печь -> FurnaceNorms, совместимый
+    с параметром norms функций report_core.
+    """
+    def __init__(self, versions: List[Tuple[date, Dict[str, FurnaceNorms]]]):
+        self.versions = sorted(versions, key=lambda version: version[0])
+        self._starts = [start.toordinal() for start, _ in self.versions]
+        self._by_text: Dict[str, Dict[str, FurnaceNorms]] = {}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'NormsBook':
+        stages = data.get('stages', STAGE_SPANS)
+        missing = [stage for stage in STAGE_SPANS if stage not in stages]
+        if missing:
+            raise NormsError(f"stages: не объявлены обязательные этапы {', '.join(missing)}")
+
+        versions = []
+        for i, version in enumerate(data.get('versions', [])):
+            where = f"versions[{i}]"
+            try:
+                start = parse_date(version['from'])
+            except (KeyError, TypeError, ValueError):
+                raise NormsError(f"{where}: дата начала действия 'from' в формате дд.мм.гггг") from None
+            furnaces = {
+                furnace: compile_furnace(values, stages, f"{where}, {furnace}")
+                for furnace, values in version.get('furnaces', {}).items()
+            }
+            versions.append((start, furnaces))
+        if not versions:
+            raise NormsError("В файле нет ни одной версии нормативов")
+        if len({start for start, _ in versions}) != len(versions):
+            raise NormsError("Несколько версий нормативов с одной датой начала")
+        return cls(versions)
+
+    @classmethod
+    def builtin(cls) -> 'NormsBook':
+        """Встроенные нормативы report_core.NORMS, действующие всегда"""
+        return cls.from_dict({'versions': [{'from': '01.01.1900', 'furnaces': NORMS}]})
+
+    def for_date(self, run_date) -> Dict[str, FurnaceNorms]:
+        """
+        Нормативы печей, действующие на дату (дд.мм.гггг или date).
+        Для даты раньше первой версии - ValueError.
+        """
+        if isinstance(run_date, str):
+            cached = self._by_text.get(run_date)
+            if cached is not None:
+                return cached
+            day = parse_date(run_date)
+        else:
+            day = run_date
+        index = bisect_right(self._starts, day.toordinal()) - 1
+        if index < 0:
+            raise ValueError(f"Нет нормативов на дату {format_date(day)}: "
+                             f"первая версия действует с {format_date(self.versions[0][0])}")
+        result = self.versions[index][1]
+        if isinstance(run_date, str):
+            if len(self._by_text) >= 4096:
+                self._by_text.clear()
+            self._by_text[run_date] = result
+        return result
+
+    def periods(self) -> Iterator[Tuple[date, Optional[date], Dict[str, FurnaceNorms]]]:
+        """Версии как периоды действия: (начало, начало следующей или None, нормативы)"""
+        for i, (start, furnaces) in enumerate(self.versions):
+            end = self.versions[i + 1][0] if i + 1 < len(self.versions) else None
+            yield start, end, furnaces
+
+    def furnaces(self) -> List[str]:
+        """Все печи: сначала из последней версии в ее порядке, затем прежние"""
+        names: List[str] = []
+        for _, furnaces in reversed(self.versions):
+            names.extend(name for name in furnaces if name not in names)
+        return names
+
+
+def load_norms_file(path: str) -> NormsBook:
+    """Читает и компилирует файл нормативов"""
+    with open(path, encoding='utf-8') as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise NormsError(f"{path}: {e}") from None
+    return NormsBook.from_dict(data)
+
+
+class _Loader:
+    """Текущие нормативы с перечитыванием файла после изменения"""
+    def __init__(self, path: str):
+        self.path = path
+        self.book: Optional[NormsBook] = None
+        self.mtime: Optional[int] = None
+        self.checked = 0.0
+
+    def get(self) -> NormsBook:
+        now = time.monotonic()
+        if self.book is not None and now - self.checked < RELOAD_INTERVAL:
+            return self.book
+        self.checked = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if self.book is not None and mtime == self.mtime:
+            return self.book
+
+        if mtime is None:
+            book = NormsBook.builtin()
+        else:
+            try:
+                book = load_norms_file(self.path)
+            except (OSError, NormsError) as e:
+                if self.book is None:
+                    raise
+                # Ошибка в правке файла: продолжаем работать по прежним нормативам
+                log.warning("Нормативы не перечитаны: %s", e)
+                self.mtime = mtime
+                return self.book
+        self.book, self.mtime = book, mtime
+        return book
+
+
+_loaders: Dict[str, _Loader] = {}
+
+
+def get_norms_book(path: Optional[str] = None) -> NormsBook:
+    """Текущие нормативы из файла (перечитываются после его изменения)"""
+    path = path or NORMS_PATH
+    loader = _loaders.get(path)
+    if loader is None:
+        loader = _loaders[path] = _Loader(path)
+    return loader.get()
+
+
+def norms_for(run_date, path: Optional[str] = None) -> Dict[str, FurnaceNorms]:
+    """Нормативы печей, действующие на дату прогона"""
+    return get_norms_book(path).for_date(run_date)
+
+
+def furnace_names(path: Optional[str] = None) -> List[str]:
+    """Печи из файла нормативов для выбора в форме и порядка разделов отчета"""
+    return get_norms_book(path).furnaces()
+
+
+def evaluate(run: FurnaceRun, path: Optional[str] = None) -> RunMetrics:
+    """Проверяет прогон и рассчитывает его по нормативам на дату прогона"""
+    norms = norms_for(run.date, path)
+    run.validate(norms)
+    return compute_metrics(run, norms)
@@ -0,0 +1,161 @@
+"""
+Выгрузка истории прогонов в Parquet для аналитики.
+
+Набор данных разбит по годам и месяцам в стиле Hive:
+    <каталог>/year=2025/month=03/2025-03.parquet
+Файл месяца - одна группа строк, упорядоченная по дате. При повторной
+выгрузке переписываются только файлы месяцев, прогоны которых
+сохранялись после прошлой выгрузки (по времени сохранения в хранилище;
+отметка хранится в <каталог>/_export_state.json), остальной набор
+не затрагивается. Файлов и групп строк немного (по одной на месяц),
+поэтому выборка за годы не упирается в открытие тысяч файлов и групп
+по паре строк (а именно так выходит при группе строк на каждый день).
+
+Колонки типизированы: run_date (date32), furnace (словарь), отметки
+prog1_start..prog2_end (timestamp, с учетом перехода через полночь),
+длительности этапов в минутах (int32), отклонения в процентах (float64),
+уведомления, время сохранения и дополнительные этапы из файла нормативов
+(JSON-строка {этап: [минуты, отклонение]}, как в хранилище). Читается целиком или выборочно, например:
+    pyarrow.dataset.dataset('export/', partitioning='hive')
+
+Требует pyarrow. Пример:
+    python parquet_export.py export/ --db runs.sqlite3
+"""
+import argparse
+import calendar
+import json
+import os
+import sys
+import tempfile
+from datetime import date, datetime
+from itertools import groupby
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from report_core import parse_hhmm
+from run_store import DEFAULT_DB_PATH, RUN_COLUMNS, RunStore
+
+STATE_FILE = '_export_state.json'
+
+MARK_COLUMNS = ('prog1_start', 'prog1_end', 'prog2_start', 'prog2_end')
+TIME_COLUMNS = ('stage1_time', 'stage2_time', 'break_time', 'total_time')
+DEV_COLUMNS = ('stage1_dev', 'stage2_dev', 'break_dev', 'total_dev')
+
+SCHEMA = pa.schema(
+    [pa.field('run_date', pa.date32()),
+     pa.field('furnace', pa.dictionary(pa.int16(), pa.string()))]
+    + [pa.field(name, pa.timestamp('ms')) for name in MARK_COLUMNS]
+    + [pa.field(name, pa.int32()) for name in TIME_COLUMNS]
+    + [pa.field(name, pa.float64()) for name in DEV_COLUMNS]
+    + [pa.field('notifications', pa.string()),
+       pa.field('updated_at', pa.timestamp('ms')),
+       pa.field('extra_stages', pa.string())]
+)
+
+_EPOCH = date(1970, 1, 1)
+
+
+def month_path(directory: str, year: int, month: int) -> str:
+    """Файл месяца в наборе данных"""
+    return os.path.join(directory, f'year={year}', f'month={month:02d}',
+                        f'{year}-{month:02d}.parquet')
+
+
+def day_table(run_date: date, rows: List[tuple]) -> pa.Table:
+    """Таблица прогонов одной даты из строк хранилища (колонки RUN_COLUMNS)"""
+    midnight = (run_date - _EPOCH).days * 86400000
+    columns = list(zip(*rows))
+    arrays = [
+        pa.array([run_date] * len(rows), pa.date32()),
+        pa.array(columns[1], pa.string()).dictionary_encode().cast(SCHEMA.field('furnace').type),
+    ]
+    for values in columns[2:6]:
+        arrays.append(pa.array([midnight + parse_hhmm(mark) * 60000 for mark in values],
+                               pa.int64()).cast(pa.timestamp('ms')))
+    arrays.extend(pa.array(values, pa.int32()) for values in columns[6:10])
+    arrays.extend(pa.array(values, pa.float64()) for values in columns[10:14])
+    arrays.append(pa.array(columns[14], pa.string()))
+    arrays.append(pa.array([datetime.fromisoformat(value) for value in columns[15]],
+                           pa.timestamp('ms')))
+    arrays.append(pa.array(columns[16], pa.string()))
+    return pa.Table.from_arrays(arrays, schema=SCHEMA)
+
+
+def write_month(directory: str, year: int, month: int, days: Iterable[Tuple[date, List[tuple]]]):
+    """Атомарно записывает файл месяца (одна группа строк)"""
+    path = month_path(directory, year, month)
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    # Временный файл с точкой в начале имени наборы данных pyarrow пропускают
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.' + os.path.basename(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        table = pa.concat_tables([day_table(run_date, rows) for run_date, rows in days])
+        pq.write_table(table, tmp_path, compression='zstd', row_group_size=table.num_rows)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _read_state(directory: str) -> Optional[str]:
+    try:
+        with open(os.path.join(directory, STATE_FILE), encoding='utf-8') as f:
+            return json.load(f)['started']
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+def _write_state(directory: str, started: str):
+    # Отметка пишется после файлов месяцев: при сбое они выгрузятся повторно
+    path = os.path.join(directory, STATE_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'started': started}, f)
+    os.replace(path + '.tmp', path)
+
+
+def _month_days(store: RunStore, year: int, month: int) -> Iterator[Tuple[date, List[tuple]]]:
+    """Строки хранилища за месяц, сгруппированные по дате"""
+    rows = store.select(RUN_COLUMNS, date(year, month, 1),
+                        date(year, month, calendar.monthrange(year, month)[1]))
+    for run_date, day_rows in groupby(rows, key=lambda row: row[0]):
+        yield date.fromisoformat(run_date), list(day_rows)
+
+
+def export(store: RunStore, directory: str, full: bool = False) -> int:
+    """
+    Выгружает месяцы, изменившиеся после прошлой выгрузки
+    (все месяцы при full). Возвращает число записанных файлов месяцев.
+    """
+    os.makedirs(directory, exist_ok=True)
+    # Отметка - начало выгрузки: прогоны, сохраненные во время нее,
+    # попадут и в следующую
+    started = datetime.now().isoformat(timespec='seconds')
+    dates = store.updated_dates(None if full else _read_state(directory))
+    months = sorted({(int(iso[:4]), int(iso[5:7])) for iso in dates})
+    for year, month in months:
+        write_month(directory, year, month, _month_days(store, year, month))
+    _write_state(directory, started)
+    return len(months)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Выгрузка истории прогонов в Parquet')
+    parser.add_argument('directory', help='каталог набора данных')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='файл хранилища прогонов')
+    parser.add_argument('--full', action='store_true', help='выгрузить все даты заново')
+    args = parser.parse_args(argv)
+
+    with RunStore(args.db) as store:
+        written = export(store, args.directory, full=args.full)
+    print(f"Выгружено месяцев: {written}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Сравнение двух дат или двух периодов по печам.
+
+Для каждой печи рядом показываются средние времена этапов, перерыва
+и общего времени за оба периода, изменение во втором периоде
+относительно первого (🔺 дольше, 🔻 короче, ❎ без изменений)
+и среднее отклонение от нормы. Данные берутся из хранилища прогонов,
+где времена и отклонения рассчитаны при сохранении: суммы по печам
+за период считает SQLite по индексу дат, файлы отчетов не читаются,
+поэтому сравнение кварталов занимает миллисекунды.
+
+Период - дата дд.мм.гггг или диапазон дд.мм.гггг-дд.мм.гггг. Примеры:
+    python period_compare.py 14.03.2025 21.03.2025
+    python period_compare.py 01.01.2025-31.03.2025 01.04.2025-30.06.2025
+    python period_compare.py --week          # эта неделя против прошлой
+"""
+import argparse
+import sys
+from datetime import date, timedelta
+from typing import Dict, Optional, Tuple
+
+from daily_report import furnace_order, furnace_sort_key, section_key
+from report_core import (format_date, format_percent, format_time, get_deviation_symbol,
+                         parse_date)
+from run_store import DEFAULT_DB_PATH, RunStore
+
+# Строки таблицы: заголовок и позиция среднего времени / отклонения в суммах хранилища
+ROWS = (
+    ('Этап 1', 0),
+    ('Этап 2', 1),
+    ('Перерыв', 2),
+    ('Общее время', 3),
+)
+
+Period = Tuple[date, date]
+
+
+def parse_period(text: str) -> Period:
+    """Дата или диапазон дат 'дд.мм.гггг-дд.мм.гггг'"""
+    first, _, last = text.partition('-')
+    start = parse_date(first.strip())
+    end = parse_date(last.strip()) if last else start
+    if end < start:
+        raise ValueError(f"Конец периода раньше начала: {text}")
+    return start, end
+
+
+def week_periods(today: Optional[date] = None) -> Tuple[Period, Period]:
+    """Прошлая неделя и текущая неделя (с понедельника по сегодня)"""
+    today = today or date.today()
+    monday = today - timedelta(days=today.weekday())
+    return (monday - timedelta(days=7), monday - timedelta(days=1)), (monday, today)
+
+
+def period_title(period: Period) -> str:
+    start, end = period
+    if start == end:
+        return format_date(start)
+    return f"{format_date(start)} - {format_date(end)}"
+
+
+def averages(totals: Tuple[int, ...]) -> Tuple[int, Tuple[float, ...], Tuple[float, ...]]:
+    """(прогонов, средние времена этапов, средние отклонения от нормы)"""
+    count = totals[0]
+    times = tuple(value / count for value in totals[1:5])
+    deviations = tuple(value / count for value in totals[5:9])
+    return count, times, deviations
+
+
+def _change_cell(before: float, after: float) -> str:
+    """Изменение времени во втором периоде: минуты и проценты"""
+    diff = round(after) - round(before)
+    percent = diff / round(before) * 100 if round(before) else 0.0
+    sign = '+' if diff > 0 else '-' if diff < 0 else ''
+    return (f"{get_deviation_symbol(diff)} {sign}{format_time(abs(diff))} "
+            f"({format_percent(percent)}%)")
+
+
+def _deviation_cell(value: float) -> str:
+    return f"{get_deviation_symbol(round(value, 2))} {format_percent(value)}%"
+
+
+def render_comparison(first: Period, second: Period,
+                      first_totals: Dict[str, Tuple], second_totals: Dict[str, Tuple]) -> str:
+    """Отчет сравнения двух периодов в формате Markdown"""
+    first_title, second_title = period_title(first), period_title(second)
+    lines = ["📊 **СРАВНЕНИЕ ПЕРИОДОВ** 📊",
+             f"**{first_title}** → **{second_title}**"]
+    order = furnace_order()
+    furnaces = sorted(set(first_totals) | set(second_totals),
+                      key=lambda furnace: furnace_sort_key(section_key(furnace), order))
+    if not furnaces:
+        lines.append("Нет данных ни за один из периодов")
+        return '\n'.join(lines)
+
+    for furnace in furnaces:
+        lines += ['▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬', f"🔘 **{furnace.upper()}**"]
+        if furnace not in first_totals or furnace not in second_totals:
+            period, totals = ((second_title, second_totals[furnace]) if furnace in second_totals
+                              else (first_title, first_totals[furnace]))
+            lines.append(f"Прогоны только за {period} ({totals[0]}) - сравнивать не с чем")
+            continue
+
+        count_a, times_a, devs_a = averages(first_totals[furnace])
+        count_b, times_b, devs_b = averages(second_totals[furnace])
+        lines += [
+            f"Прогонов: **{count_a}** → **{count_b}**",
+            '',
+            "| Этап | Было | Стало | Изменение | Откл. от нормы было | Откл. от нормы стало |",
+            '|---|---|---|---|---|---|',
+        ]
+        for title, i in ROWS:
+            lines.append(
+                f"| {title} | {format_time(round(times_a[i]))} | {format_time(round(times_b[i]))} "
+                f"| {_change_cell(times_a[i], times_b[i])} "
+                f"| {_deviation_cell(devs_a[i])} | {_deviation_cell(devs_b[i])} |")
+    lines.append('▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬')
+    return '\n'.join(lines)
+
+
+def compare(store: RunStore, first: Period, second: Period) -> str:
+    """Сравнивает два периода по данным хранилища"""
+    return render_comparison(first, second,
+                             store.furnace_totals(*first), store.furnace_totals(*second))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Сравнение двух дат или периодов по печам')
+    parser.add_argument('first', nargs='?', help='первый период: дд.мм.гггг или дд.мм.гггг-дд.мм.гггг')
+    parser.add_argument('second', nargs='?', help='второй период')
+    parser.add_argument('--week', action='store_true', help='текущая неделя против прошлой')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH,
+                        help=f'хранилище прогонов (по умолчанию {DEFAULT_DB_PATH})')
+    parser.add_argument('-o', '--output', help='файл отчета (по умолчанию вывод на экран)')
+    args = parser.parse_args(argv)
+
+    if args.week:
+        first, second = week_periods()
+    elif args.first and args.second:
+        try:
+            first, second = parse_period(args.first), parse_period(args.second)
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        parser.error('укажите два периода или --week')
+
+    with RunStore(args.db) as store:
+        report = compare(store, first, second)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report)
+        print(f"Сравнение сохранено: {args.output}")
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+Массовое перестроение отчетов из хранилища прогонов.
+
+После изменения нормативов или шаблона отчета все ранее сформированные
+Отчет_*.md устаревают. Команда берет прогоны из хранилища, делит даты
+на пачки и в пуле процессов заново рассчитывает отклонения (по
+нормативам на дату прогона) и формирует разделы печей. Разделы печей,
+которых нет в хранилище, в отчетах сохраняются.
+
+Отчет, текст которого совпадает с файлом на диске (сравнение по хешу
+содержимого), не перезаписывается. Изменившиеся отчеты пачки
+записываются одним пакетом (save_reports) под блокировкой отчета
+со сверкой версии, как при обычном сохранении: раздел, отправленный
+с рабочего места во время перестроения, не теряется. Пересчитанные
+отклонения сохраняются в хранилище пачками. Ход работы выводится в stderr.
+
+Пример:
+    python regenerate.py -o reports/ --from 01.01.2025
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from itertools import groupby
+from typing import Iterator, List, Optional, Tuple
+
+import norms_book
+import report_core
+from daily_report import DailyReport, save_reports, version_stamp
+from report_core import FurnaceRun, RunMetrics
+from run_store import DEFAULT_DB_PATH, RunStore
+
+# Сколько дат обрабатывает одна задача пула
+DATES_PER_TASK = 256
+
+_COLUMNS = ('run_date', 'furnace', 'prog1_start', 'prog1_end',
+            'prog2_start', 'prog2_end', 'notifications')
+
+# Прогоны одной даты: (дата дд.мм.гггг, [(печь, 4 отметки, уведомления)])
+DateGroup = Tuple[str, List[tuple]]
+
+
+def render_dates(output_dir: str, groups: List[DateGroup]):
+    """
+    Перестраивает отчеты пачки дат (выполняется в процессе пула).
+    Возвращает (число изменившихся отчетов, пересчитанные прогоны, ошибки).
+    """
+    changed = []
+    results: List[Tuple[FurnaceRun, RunMetrics]] = []
+    errors: List[str] = []
+    for date_text, rows in groups:
+        path = os.path.join(output_dir, report_core.report_filename(date_text))
+        report = DailyReport.load(path, date_text)
+        report.header = report_core.render_header(date_text)
+        for furnace, *times, notifications in rows:
+            try:
+                run = FurnaceRun.from_text(date_text, furnace, *times, notifications=notifications)
+                metrics = norms_book.evaluate(run)
+            except ValueError as e:
+                errors.append(f"{date_text}, {furnace}: {e}")
+                continue
+            report.set_run(run, metrics)
+            # Нормативы в хранилище не сохраняются, незачем передавать их из процесса
+            metrics.norms = {}
+            results.append((run, metrics))
+
+        # Версия загруженного отчета - хеш текста файла, перечитывать его не нужно
+        if version_stamp(report.render()) != report.base_version:
+            changed.append((path, report))
+
+    if changed:
+        save_reports(changed)
+    return len(changed), results, errors
+
+
+def _render_args(args):
+    return render_dates(*args)
+
+
+def date_groups(store: RunStore, start=None, end=None) -> Iterator[DateGroup]:
+    """Прогоны хранилища, сгруппированные по дате"""
+    rows = store.select(_COLUMNS, start, end)
+    for run_date, day_rows in groupby(rows, key=lambda row: row[0]):
+        yield (report_core.format_date(date.fromisoformat(run_date)),
+               [row[1:] for row in day_rows])
+
+
+def _batches(groups: Iterator[DateGroup], size: int) -> Iterator[List[DateGroup]]:
+    batch = []
+    for group in groups:
+        batch.append(group)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def regenerate(store: RunStore, output_dir: str, start=None, end=None,
+               workers: Optional[int] = None, update_store: bool = True,
+               progress=sys.stderr) -> Tuple[int, int, int]:
+    """
+    Перестраивает отчеты за период. Возвращает
+    (число дат, число перезаписанных отчетов, число ошибок).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    total = store.count_dates(start, end)
+    groups = date_groups(store, start, end)
+    tasks = [(output_dir, batch) for batch in _batches(groups, DATES_PER_TASK)]
+
+    if workers == 1 or len(tasks) <= 1:
+        results = map(_render_args, tasks)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(_render_args, tasks)
+
+    done = written = errors = 0
+    started = time.perf_counter()
+    try:
+        for (_, batch), (changed, runs, batch_errors) in zip(tasks, results):
+            done += len(batch)
+            written += changed
+            errors += len(batch_errors)
+            for message in batch_errors:
+                print(f"\nПропущен прогон {message}", file=sys.stderr)
+            if update_store and runs:
+                store.save_many(runs)
+            if progress is not None:
+                print(f"\rДаты: {done}/{total}, перезаписано отчетов: {written}, "
+                      f"ошибок: {errors}, {time.perf_counter() - started:.1f} с",
+                      end='', file=progress, flush=True)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if progress is not None and tasks:
+        print(file=progress)
+    return done, written, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Перестроение отчетов из хранилища после изменения нормативов или шаблона')
+    parser.add_argument('-o', '--output-dir', default='.', help='каталог отчетов')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH,
+                        help=f'хранилище прогонов (по умолчанию {DEFAULT_DB_PATH})')
+    parser.add_argument('--from', dest='start', help='первая дата дд.мм.гггг')
+    parser.add_argument('--to', dest='end', help='последняя дата дд.мм.гггг')
+    parser.add_argument('-j', '--workers', type=int, help='число процессов (по умолчанию - все ядра)')
+    parser.add_argument('--keep-store', action='store_true',
+                        help='не сохранять пересчитанные отклонения в хранилище')
+    args = parser.parse_args(argv)
+
+    try:
+        start = report_core.parse_date(args.start) if args.start else None
+        end = report_core.parse_date(args.end) if args.end else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    with RunStore(args.db) as store:
+        dates, written, errors = regenerate(store, args.output_dir, start, end,
+                                            args.workers, not args.keep_store)
+    print(f"Дат: {dates}, перезаписано отчетов: {written}, ошибок: {errors}")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
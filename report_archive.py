@@ -0,0 +1,203 @@
+"""
+Архив отчетов по месяцам.
+
+Отчеты закрытого месяца упаковываются в один файл Отчеты_мм_гггг.zip
+в том же каталоге, а отдельные файлы удаляются. Каждый отчет сжат
+отдельно (deflate), а центральный каталог zip служит индексом
+смещений: отчет за любой день читается без распаковки остальных.
+
+Чтение прозрачное: DailyReport.load, сервис отчетов и окно просмотра
+отчета ищут сначала отдельный файл, затем архив месяца. Если в архивный
+месяц дописывается прогон, рядом появляется отдельный файл; при
+следующей упаковке он заменяет версию из архива.
+
+Пример:
+    python report_archive.py reports/            # все закрытые месяцы
+    python report_archive.py reports/ -m 03.2025 # один месяц
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import zipfile
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+REPORT_FILE = re.compile(r'^Отчет_(\d{2})_(\d{2})_(\d{4})\.md$')
+ARCHIVE_FILE = re.compile(r'^Отчеты_(\d{2})_(\d{4})\.zip$')
+
+
+def archive_name(year: int, month: int) -> str:
+    """Имя файла архива за месяц"""
+    return f'Отчеты_{month:02d}_{year}.zip'
+
+
+def _report_date(name: str) -> Optional[date]:
+    """Дата отчета по имени файла (None для других файлов)"""
+    match = REPORT_FILE.match(name)
+    if match is None:
+        return None
+    day, month, year = (int(part) for part in match.groups())
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def archive_for(path: str) -> Optional[str]:
+    """Путь к архиву месяца, в котором может лежать отчет path"""
+    directory, name = os.path.split(path)
+    report_date = _report_date(name)
+    if report_date is None:
+        return None
+    return os.path.join(directory, archive_name(report_date.year, report_date.month))
+
+
+def read_archived(path: str) -> Tuple[int, str]:
+    """
+    Читает отчет path из архива его месяца.
+    Возвращает (время изменения архива в нс, текст);
+    FileNotFoundError, если отчета нет и в архиве.
+    """
+    archive = archive_for(path)
+    if archive is None:
+        raise FileNotFoundError(path)
+    try:
+        mtime = os.stat(archive).st_mtime_ns
+        with zipfile.ZipFile(archive) as zf:
+            data = zf.read(os.path.basename(path))
+    except KeyError:
+        raise FileNotFoundError(path) from None
+    return mtime, data.decode('utf-8')
+
+
+def read_report(path: str) -> str:
+    """Текст отчета из отдельного файла или из архива месяца"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return read_archived(path)[1]
+
+
+def report_dates(directory: str, start: Optional[date] = None,
+                 end: Optional[date] = None) -> List[date]:
+    """Даты всех отчетов каталога (отдельных и в архивах), по возрастанию"""
+    found = set()
+    for name in os.listdir(directory):
+        if ARCHIVE_FILE.match(name):
+            try:
+                with zipfile.ZipFile(os.path.join(directory, name)) as zf:
+                    names = zf.namelist()
+            except (OSError, zipfile.BadZipFile):
+                continue
+        else:
+            names = (name,)
+        for member in names:
+            report_date = _report_date(member)
+            if report_date is not None:
+                found.add(report_date)
+    return sorted(d for d in found
+                  if (start is None or d >= start) and (end is None or d <= end))
+
+
+def archive_month(directory: str, year: int, month: int) -> int:
+    """
+    Упаковывает отчеты месяца в архив и удаляет отдельные файлы.
+    Существующий архив дополняется; отдельный файл заменяет версию
+    из архива. Архив записывается во временный файл и подменяется
+    атомарно. Отдельный файл удаляется под блокировкой отчета
+    (daily_report.report_lock) и только если его содержимое совпадает
+    с упакованным. Возвращает число упакованных файлов.
+    """
+    from daily_report import report_lock
+
+    loose: Dict[str, str] = {}
+    for name in os.listdir(directory):
+        report_date = _report_date(name)
+        if report_date is not None and (report_date.year, report_date.month) == (year, month):
+            loose[name] = os.path.join(directory, name)
+    if not loose:
+        return 0
+
+    archive = os.path.join(directory, archive_name(year, month))
+    packed: Dict[str, bytes] = {}
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + archive_name(year, month),
+                                    suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            with zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED, compresslevel=9) as out:
+                if os.path.exists(archive):
+                    with zipfile.ZipFile(archive) as old:
+                        for info in old.infolist():
+                            if info.filename not in loose:
+                                # Отчеты, для которых нет более новых отдельных файлов
+                                out.writestr(info, old.read(info), compress_type=info.compress_type)
+                for name in sorted(loose):
+                    with open(loose[name], 'rb') as report:
+                        packed[name] = report.read()
+                    out.writestr(zipfile.ZipInfo.from_file(loose[name], name), packed[name],
+                                 compress_type=zipfile.ZIP_DEFLATED)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, archive)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    for name, path in loose.items():
+        # Файл, перезаписанный во время упаковки, остается до следующей
+        with report_lock(path):
+            try:
+                with open(path, 'rb') as report:
+                    if report.read() != packed[name]:
+                        continue
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+    return len(loose)
+
+
+def closed_months(directory: str, today: Optional[date] = None) -> List[Tuple[int, int]]:
+    """Месяцы до текущего, за которые в каталоге есть отдельные файлы отчетов"""
+    today = today or date.today()
+    months = set()
+    for name in os.listdir(directory):
+        report_date = _report_date(name)
+        if report_date is not None and (report_date.year, report_date.month) < (today.year, today.month):
+            months.add((report_date.year, report_date.month))
+    return sorted(months)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Упаковка отчетов закрытых месяцев в архивы')
+    parser.add_argument('directory', nargs='?', default='.', help='каталог отчетов')
+    parser.add_argument('-m', '--month', help='месяц в формате мм.гггг (по умолчанию все закрытые)')
+    args = parser.parse_args(argv)
+
+    if args.month:
+        try:
+            month, year = (int(part) for part in args.month.split('.'))
+            if not 1 <= month <= 12:
+                raise ValueError
+        except ValueError:
+            parser.error('месяц указывается в формате мм.гггг')
+        months = [(year, month)]
+    else:
+        months = closed_months(args.directory)
+
+    for year, month in months:
+        count = archive_month(args.directory, year, month)
+        print(f"{archive_name(year, month)}: упаковано отчетов: {count}")
+    if not months:
+        print("Нет отчетов для упаковки", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+Пакетная генерация отчетов из командной строки (без Kivy).
+
+Читает прогоны печей из CSV или JSONL потоком и формирует отчеты
+за один запуск процесса. Колонки CSV и ключи JSONL совпадают с полями
+FurnaceRun: date, furnace, prog1_start, prog1_end, prog2_start,
+prog2_end, notifications (необязательно). Отметки времени - ЧЧ:ММ;
+для программ дольше суток допускается явный сдвиг в днях: 03:40+1.
+
+Пример:
+    python report_cli.py runs.csv -o reports/
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from typing import Dict, Iterator, Optional, Tuple, Union
+
+import norms_book
+import report_core
+from report_core import FurnaceRun
+from run_store import DEFAULT_DB_PATH, RunStore
+from daily_report import DailyReport
+
+RUN_FIELDS = FurnaceRun.FIELDS
+
+# Сколько прогонов сохраняется в хранилище одной транзакцией
+STORE_BATCH_SIZE = 1000
+
+
+def _values_from_mapping(row) -> Dict[str, str]:
+    """Текстовые поля прогона из строки CSV или объекта JSON"""
+    return {name: str(row.get(name) or '').strip() for name in RUN_FIELDS}
+
+
+def parse_row(row: Union[str, Dict]) -> Dict[str, str]:
+    """
+    Поля для FurnaceRun.from_text из строки CSV (словарь) или строки
+    JSONL (текст). Неверный JSON или не объект - ValueError.
+    """
+    if isinstance(row, str):
+        row = json.loads(row)
+        if not isinstance(row, dict):
+            raise ValueError("строка JSONL должна быть объектом JSON")
+    return _values_from_mapping(row)
+
+
+def iter_rows(path: str, fmt: str = 'auto') -> Iterator[Tuple[int, Union[str, Dict]]]:
+    """
+    Потоково читает прогоны из файла.
+    Возвращает пары (номер строки, строка для parse_row);
+    '-' означает stdin.
+    """
+    if fmt == 'auto':
+        fmt = 'jsonl' if path.lower().endswith(('.jsonl', '.json')) else 'csv'
+
+    stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'jsonl':
+            for line_no, line in enumerate(stream, start=1):
+                if line.strip():
+                    yield line_no, line
+        else:
+            reader = csv.DictReader(stream)
+            for row in reader:
+                yield reader.line_num, row
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def generate_batch(path: str, output_dir: str, fmt: str = 'auto',
+                   store: Optional[RunStore] = None) -> Tuple[int, int]:
+    """
+    Формирует отчеты для всех прогонов файла и, если передано хранилище,
+    сохраняет в него прогоны пачками. Разделы печей за одну дату
+    собираются в общий ежедневный отчет; подряд идущие прогоны одной
+    даты объединяются в памяти и записываются один раз.
+    Ошибочные строки пропускаются с сообщением в stderr.
+    Возвращает (число обработанных прогонов, число ошибок).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    written = errors = 0
+    pending = []
+    report_path, report = None, None
+    for line_no, row in iter_rows(path, fmt):
+        try:
+            run = FurnaceRun.from_text(**parse_row(row))
+            metrics = norms_book.evaluate(run)
+        except ValueError as e:
+            errors += 1
+            print(f"{path}:{line_no}: {e}", file=sys.stderr)
+            continue
+        target = os.path.join(output_dir, report_core.report_filename(run.date))
+        if target != report_path:
+            if report is not None:
+                report.save(report_path)
+            report_path, report = target, DailyReport.load(target, run.date)
+        report.set_run(run, metrics)
+        written += 1
+
+        if store is not None:
+            pending.append((run, metrics))
+            if len(pending) >= STORE_BATCH_SIZE:
+                store.save_many(pending)
+                pending.clear()
+
+    if report is not None:
+        report.save(report_path)
+    if store is not None and pending:
+        store.save_many(pending)
+    return written, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Пакетная генерация отчетов термообработки из CSV/JSONL')
+    parser.add_argument('input', help="файл CSV или JSONL с прогонами ('-' - stdin)")
+    parser.add_argument('-o', '--output-dir', default='.',
+                        help='каталог для отчетов (по умолчанию текущий)')
+    parser.add_argument('-f', '--format', choices=('auto', 'csv', 'jsonl'), default='auto',
+                        help='формат входных данных (по умолчанию по расширению)')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH,
+                        help=f'хранилище прогонов (по умолчанию {DEFAULT_DB_PATH})')
+    parser.add_argument('--no-db', action='store_true',
+                        help='не сохранять прогоны в хранилище')
+    args = parser.parse_args(argv)
+
+    if args.no_db:
+        written, errors = generate_batch(args.input, args.output_dir, args.format)
+    else:
+        with RunStore(args.db) as store:
+            written, errors = generate_batch(args.input, args.output_dir, args.format, store)
+    print(f"Обработано прогонов: {written}, ошибок: {errors}")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Клиент сервиса отчетов (report_server.py).
+
+RemoteReportWriter - замена ReportWriter для рабочих мест, которые
+отправляют прогоны на общий сервис вместо записи файлов на общий диск.
+Объединение частых отправок, повторы при недоступности сервиса
+и передача результата через dispatch работают так же, как у ReportWriter.
+
+Графическое приложение использует сервис, если задана переменная
+окружения T2MD_SERVER, например T2MD_SERVER=http://10.0.0.5:8765.
+"""
+import json
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from report_writer import ReportWriter
+
+SERVER_URL = os.environ.get('T2MD_SERVER')
+
+# Таймаут одного запроса к сервису, секунды
+TIMEOUT = 10.0
+
+
+class ServiceError(ValueError):
+    """Сервис отклонил запрос (ошибка в данных прогона и т.п.); status - код HTTP"""
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+def _request(url: str, data: Optional[bytes] = None) -> bytes:
+    request = Request(url, data=data, method='POST' if data is not None else 'GET')
+    if data is not None:
+        request.add_header('Content-Type', 'application/json')
+    try:
+        with urlopen(request, timeout=TIMEOUT) as response:
+            return response.read()
+    except HTTPError as e:
+        # Ответ сервиса с описанием ошибки; такие запросы не повторяются
+        try:
+            message = json.loads(e.read().decode('utf-8'))['error']
+        except (ValueError, KeyError):
+            message = f"HTTP {e.code}"
+        raise ServiceError(message, e.code) from None
+
+
+def submit_runs(base_url: str, runs) -> List[str]:
+    """Отправляет прогоны на сервис, возвращает имена файлов отчетов"""
+    body = json.dumps({'runs': [run.as_text() for run in runs]}, ensure_ascii=False)
+    answer = _request(base_url.rstrip('/') + '/runs', body.encode('utf-8'))
+    return json.loads(answer.decode('utf-8'))['reports']
+
+
+def fetch_report(base_url: str, date_text: str) -> Optional[str]:
+    """
+    Текст отчета за дату или None, если отчета нет (404).
+    Остальные отказы сервиса - ServiceError.
+    """
+    try:
+        return _request(f"{base_url.rstrip('/')}/reports/{quote(date_text)}").decode('utf-8')
+    except ServiceError as e:
+        if e.status == 404:
+            return None
+        raise
+
+
+def list_reports(base_url: str) -> List[str]:
+    """Даты отчетов на сервисе"""
+    return json.loads(_request(base_url.rstrip('/') + '/reports').decode('utf-8'))['reports']
+
+
+def month_index(base_url: str, year: int, month: int) -> Dict[int, Tuple[int, float, float]]:
+    """Сводка по дням месяца, как RunStore.month_index, из хранилища сервиса"""
+    answer = _request(f"{base_url.rstrip('/')}/days?month={month:02d}.{year:04d}")
+    days = json.loads(answer.decode('utf-8'))['days']
+    return {int(day): tuple(summary) for day, summary in days.items()}
+
+
+class RemoteReportWriter(ReportWriter):
+    """
+    Очередь отправки прогонов на сервис отчетов. Путь задачи - только
+    ключ объединения (имя файла отчета); файл пишет сервис.
+    Сетевые ошибки (OSError) повторяются, отказ сервиса - нет.
+    """
+    def __init__(self, base_url: str, on_result: Optional[Callable] = None,
+                 dispatch: Optional[Callable] = None, **kwargs):
+        self.base_url = base_url
+        super().__init__(on_result, dispatch, **kwargs)
+
+    def _write(self, path: str, job):
+        submit_runs(self.base_url, [run for run, _ in job.runs.values()])
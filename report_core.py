@@ -0,0 +1,412 @@
+"""
+Вычислительное ядро генератора отчетов термообработки.
+
+Модуль не зависит от Kivy и может использоваться как из графического
+приложения, так и из командной строки или на сервере:
+- модель прогона печи (FurnaceRun)
+- расчет времени этапов, перерыва и отклонений от нормативов
+- формирование отчета в формате Markdown по шаблону Шаблон.md
+"""
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from report_template import ReportTemplate, load_template, register_filter
+
+# Нормативные значения (в минутах) для каждой печи.
+# Используются, если нет файла нормативов (см. norms_book.py)
+NORMS = {
+    'Печь 1': {
+        'цикл1': 510,  # 8:30 (в минутах)
+        'цикл2': 210,  # 3:30
+        'перерыв': 40,  # 0:40
+        'общее': 760   # 12:40
+    },
+    'Печь 2': {
+        'цикл1': 660,  # 11:00
+        'цикл2': 210,  # 3:30
+        'перерыв': 40,  # 0:40
+        'общее': 910   # 15:10
+    }
+}
+
+# Отметки времени прогона по порядку: прогон - всегда две программы
+# (форма, хранилище и шаблон рассчитаны на эти отметки; см. norms_book)
+MARKS = ('prog1_start', 'prog1_end', 'prog2_start', 'prog2_end')
+
+# Этапы нормативов: этап -> (отметка начала, отметка конца)
+STAGE_SPANS = {
+    'цикл1': ('prog1_start', 'prog1_end'),      # Программа 1
+    'цикл2': ('prog2_start', 'prog2_end'),      # Программа 2
+    'перерыв': ('prog1_end', 'prog2_start'),    # между программами
+    'общее': ('prog1_start', 'prog2_end'),      # от начала до конца прогона
+}
+
+MONTHS = ['Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
+          'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь']
+
+# Названия месяцев в родительном падеже для даты в шапке отчета
+MONTHS_GENITIVE = ['января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
+                   'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря']
+
+DEFAULT_NOTIFICATIONS = "Всё отработало в штатном режиме"
+
+# Шаблон отчета лежит рядом с модулем
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Шаблон.md')
+
+DATE_FORMAT = '%d.%m.%Y'
+
+MINUTES_PER_DAY = 24 * 60
+
+TIME_FORMAT_ERROR = "Неверный формат времени. Используйте ЧЧ:ММ"
+
+_ZERO = ord('0')
+
+
+def parse_hhmm(text: str) -> int:
+    """
+    Переводит 'ЧЧ:ММ' в минуты от начала суток целочисленной арифметикой.
+    Допускается явный сдвиг в днях: '03:40+1' - 03:40 следующих суток.
+    """
+    days = 0
+    if len(text) > 5 and text[5] == '+':
+        day_text = text[6:]
+        if not day_text.isdecimal() or not day_text.isascii():
+            raise ValueError(TIME_FORMAT_ERROR)
+        days = int(day_text)
+    elif len(text) != 5:
+        raise ValueError(TIME_FORMAT_ERROR)
+
+    if text[2] != ':':
+        raise ValueError(TIME_FORMAT_ERROR)
+    h1, h2, m1, m2 = (ord(text[i]) - _ZERO for i in (0, 1, 3, 4))
+    if not (0 <= h1 <= 2 and 0 <= h2 <= 9 and 0 <= m1 <= 5 and 0 <= m2 <= 9):
+        raise ValueError(TIME_FORMAT_ERROR)
+    hours = h1 * 10 + h2
+    if hours > 23:
+        raise ValueError(TIME_FORMAT_ERROR)
+    return days * MINUTES_PER_DAY + hours * 60 + m1 * 10 + m2
+
+
+def format_clock(minutes: int) -> str:
+    """Время суток ЧЧ:ММ для отметки в минутах от начала суток прогона"""
+    hours, mins = divmod(minutes % MINUTES_PER_DAY, 60)
+    return f"{hours:02d}:{mins:02d}"
+
+
+def format_mark(minutes: int) -> str:
+    """Отметка времени с явным сдвигом в днях: '03:40' или '03:40+1'"""
+    days = minutes // MINUTES_PER_DAY
+    return format_clock(minutes) if days == 0 else f"{format_clock(minutes)}+{days}"
+
+
+def resolve_marks(values: List[str]) -> List[int]:
+    """
+    Переводит последовательные отметки времени в минуты от начала суток прогона.
+    Отметка без явного сдвига, которая раньше предыдущей, относится
+    к следующим суткам (переход через полночь). Явно сдвинутые отметки
+    должны идти по порядку.
+    """
+    marks = []
+    previous = 0
+    for value in values:
+        minutes = parse_hhmm(value)
+        if minutes < previous:
+            if '+' in value:
+                raise ValueError("Отметки времени должны идти по порядку")
+            minutes += -(-(previous - minutes) // MINUTES_PER_DAY) * MINUTES_PER_DAY
+        marks.append(minutes)
+        previous = minutes
+    return marks
+
+
+def calculate_time_difference(start_time, end_time):
+    """
+    Вычисляет разницу между временем начала и конца в минутах.
+    Учитывает переход через полночь и явный сдвиг в днях ('ЧЧ:ММ+Д').
+    """
+    start, end = resolve_marks([start_time, end_time])
+    return end - start
+
+
+def calculate_deviation(actual, norm):
+    """
+    Вычисляет процентное отклонение от нормы.
+    Положительное значение - превышение нормы
+    Отрицательное значение - меньше нормы
+    """
+    deviation = ((actual - norm) / norm) * 100
+    return deviation
+
+
+def format_time(minutes):
+    """Форматирует минуты в строку ЧЧ:ММ"""
+    try:
+        hours, mins = divmod(minutes, 60)
+        return f"{int(hours):02d}:{int(mins):02d}"
+    except (TypeError, ValueError):
+        return "00:00"
+
+
+def parse_date(date_text) -> date:
+    """Преобразует дату в формате дд.мм.гггг в объект date"""
+    try:
+        return datetime.strptime(date_text, DATE_FORMAT).date()
+    except ValueError:
+        raise ValueError("Неверный формат даты. Используйте дд.мм.гггг") from None
+
+
+def format_date(value: date) -> str:
+    """Форматирует дату в строку дд.мм.гггг"""
+    return value.strftime(DATE_FORMAT)
+
+
+_PADDED_DATE = re.compile(r'\d\d\.\d\d\.\d{4}')
+
+
+def normalize_date(date_text: str) -> str:
+    """
+    Приводит дату к виду дд.мм.гггг с ведущими нулями (1.3.2025 -> 01.03.2025),
+    чтобы имя файла отчета и ключи хранилища не зависели от записи даты.
+    Несуществующая дата (31.02.2025) - ValueError.
+    """
+    day = parse_date(date_text)
+    if _PADDED_DATE.fullmatch(date_text):
+        return date_text
+    return format_date(day)
+
+
+def get_deviation_symbol(deviation):
+    """Возвращает символ отклонения в зависимости от значения"""
+    if deviation > 0:
+        return "🔺"
+    elif deviation < 0:
+        return "🔻"
+    return "❎"
+
+
+def format_date_long(date_text) -> str:
+    """Форматирует дату дд.мм.гггг как '22 марта 2025'"""
+    value = parse_date(date_text)
+    return f"{value.day} {MONTHS_GENITIVE[value.month - 1]} {value.year}"
+
+
+def format_percent(value) -> str:
+    """Форматирует проценты с запятой и без лишних нулей: -1,37 / 55 / 1,9"""
+    text = f"{value:.2f}".rstrip('0').rstrip('.')
+    if text == '-0':
+        text = '0'
+    return text.replace('.', ',')
+
+
+def format_deviation(deviation) -> str:
+    """Текст отклонения от нормы для раздела аналитики отчета"""
+    deviation = round(deviation, 2)
+    if deviation == 0:
+        return f"{get_deviation_symbol(0)} в соответствии с **нормой**"
+    return (f"{get_deviation_symbol(deviation)} **{format_percent(deviation)}%** "
+            f"от установленной **нормы**")
+
+
+register_filter('time', format_time)
+register_filter('percent', format_percent)
+register_filter('deviation', format_deviation)
+register_filter('date_long', format_date_long)
+
+
+class FurnaceRun:
+    """
+    Данные одного прогона печи за дату: отметки включения и выключения
+    двух программ и уведомления.
+
+    Отметки хранятся целыми минутами от начала суток даты прогона,
+    поэтому программа может идти дольше суток. Из текста (поля формы,
+    CSV) прогон создается через from_text.
+    """
+    __slots__ = ('date', 'furnace', 'prog1_start', 'prog1_end',
+                 'prog2_start', 'prog2_end', 'notifications')
+
+    # Поля в текстовом виде: колонки CSV/JSONL и ключи as_text()
+    FIELDS = ('date', 'furnace', 'prog1_start', 'prog1_end',
+              'prog2_start', 'prog2_end', 'notifications')
+
+    def __init__(self, date: str, furnace: str, prog1_start: int, prog1_end: int,
+                 prog2_start: int, prog2_end: int, notifications: str = ''):
+        self.date = date
+        self.furnace = furnace
+        self.prog1_start = prog1_start
+        self.prog1_end = prog1_end
+        self.prog2_start = prog2_start
+        self.prog2_end = prog2_end
+        self.notifications = notifications
+
+    @classmethod
+    def from_text(cls, date: str, furnace: str, prog1_start: str, prog1_end: str,
+                  prog2_start: str, prog2_end: str, notifications: str = '') -> 'FurnaceRun':
+        """
+        Создает прогон из текстовых отметок 'ЧЧ:ММ' (или 'ЧЧ:ММ+Д'),
+        дата приводится к виду дд.мм.гггг. При незаполненных полях или неверном формате выбрасывает ValueError
+        с сообщением для оператора.
+        """
+        times = [prog1_start, prog1_end, prog2_start, prog2_end]
+        if not date or not all(times):
+            raise ValueError("Пожалуйста, заполните все поля времени")
+        return cls(normalize_date(date), furnace, *resolve_marks(times),
+                   notifications=notifications)
+
+    def as_text(self) -> Dict[str, str]:
+        """Поля прогона в текстовом виде (обратное к from_text)"""
+        return {
+            'date': self.date,
+            'furnace': self.furnace,
+            'prog1_start': format_mark(self.prog1_start),
+            'prog1_end': format_mark(self.prog1_end),
+            'prog2_start': format_mark(self.prog2_start),
+            'prog2_end': format_mark(self.prog2_end),
+            'notifications': self.notifications,
+        }
+
+    def validate(self, norms: Optional[Dict] = None):
+        """
+        Проверяет дату (и приводит ее к виду дд.мм.гггг) и печь.
+        При ошибке выбрасывает ValueError с сообщением для оператора.
+        """
+        norms = NORMS if norms is None else norms
+        self.date = format_date(parse_date(self.date))
+
+        if self.furnace not in norms:
+            raise ValueError(f"Неизвестная печь: {self.furnace}")
+
+    def __eq__(self, other):
+        if not isinstance(other, FurnaceRun):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields_text = ', '.join(f"{k}={v!r}" for k, v in self.as_text().items())
+        return f"FurnaceRun({fields_text})"
+
+
+@dataclass
+class RunMetrics:
+    """Рассчитанные времена этапов (в минутах) и отклонения (в процентах)"""
+    stage1_time: int
+    stage2_time: int
+    break_time: int
+    total_time: int
+    stage1_dev: float
+    stage2_dev: float
+    break_dev: float
+    total_dev: float
+    norms: Dict[str, int] = field(default_factory=dict)
+    # Все этапы нормативов печи (включая дополнительные) -> минуты
+    stages: Dict[str, int] = field(default_factory=dict)
+    # Дополнительные этапы из файла нормативов -> (минуты, отклонение)
+    extra_stages: Dict[str, Tuple[int, float]] = field(default_factory=dict)
+
+
+_DEFAULT_SPANS = tuple((stage, MARKS.index(start), MARKS.index(end))
+                       for stage, (start, end) in STAGE_SPANS.items())
+
+
+def compute_metrics(run: FurnaceRun, norms: Optional[Dict] = None) -> RunMetrics:
+    """
+    Рассчитывает времена этапов, перерыва и отклонения от нормативов печи.
+    Нормативы из файла (norms_book) могут задавать свои этапы
+    как промежутки между отметками; иначе используется STAGE_SPANS.
+    """
+    norms = NORMS if norms is None else norms
+    current_norms = norms[run.furnace]
+    spans = getattr(current_norms, 'spans', _DEFAULT_SPANS)
+
+    marks = (run.prog1_start, run.prog1_end, run.prog2_start, run.prog2_end)
+    stages = {stage: marks[end] - marks[start] for stage, start, end in spans}
+
+    # Этап 1 - Программа 1, этап 2 - Программа 2, перерыв между ними,
+    # общее время - от включения Программы 1 до выключения Программы 2
+    stage1_time = stages['цикл1']
+    stage2_time = stages['цикл2']
+    break_time = stages['перерыв']
+    total_time = stages['общее']
+
+    return RunMetrics(
+        stage1_time=stage1_time,
+        stage2_time=stage2_time,
+        break_time=break_time,
+        total_time=total_time,
+        stage1_dev=calculate_deviation(stage1_time, current_norms['цикл1']),
+        stage2_dev=calculate_deviation(stage2_time, current_norms['цикл2']),
+        break_dev=calculate_deviation(break_time, current_norms['перерыв']),
+        total_dev=calculate_deviation(total_time, current_norms['общее']),
+        norms=current_norms,
+        stages=stages,
+        extra_stages={stage: (minutes, calculate_deviation(minutes, current_norms[stage]))
+                      for stage, minutes in stages.items() if stage not in STAGE_SPANS},
+    )
+
+
+def get_template(path: Optional[str] = None) -> ReportTemplate:
+    """Скомпилированный шаблон отчета (перечитывается после изменения файла)"""
+    return load_template(path or TEMPLATE_PATH)
+
+
+def format_extra_stages(extra_stages: Dict[str, Tuple[int, float]]) -> str:
+    """Строки аналитики для дополнительных этапов (пусто, если их нет)"""
+    return ''.join(f"• ⏱️ {stage.capitalize()}: `{format_time(minutes)}` "
+                   f"({format_deviation(deviation)})  \n"
+                   for stage, (minutes, deviation) in extra_stages.items())
+
+
+def report_context(run: FurnaceRun, metrics: RunMetrics) -> Dict:
+    """Значения для плейсхолдеров раздела печи"""
+    return {
+        'date': run.date,
+        'furnace': run.furnace,
+        'prog1_start': format_clock(run.prog1_start),
+        'prog1_end': format_clock(run.prog1_end),
+        'prog2_start': format_clock(run.prog2_start),
+        'prog2_end': format_clock(run.prog2_end),
+        'stage1_time': metrics.stage1_time,
+        'stage2_time': metrics.stage2_time,
+        'break_time': metrics.break_time,
+        'total_time': metrics.total_time,
+        'stage1_dev': metrics.stage1_dev,
+        'stage2_dev': metrics.stage2_dev,
+        'break_dev': metrics.break_dev,
+        'total_dev': metrics.total_dev,
+        'extra_stages': format_extra_stages(metrics.extra_stages),
+        'notifications': run.notifications.strip() or DEFAULT_NOTIFICATIONS,
+    }
+
+
+def render_header(date_text: str, template: Optional[ReportTemplate] = None) -> str:
+    """Формирует шапку ежедневного отчета"""
+    template = template or get_template()
+    return template.header.render({'date': date_text})
+
+
+def render_section(run: FurnaceRun, metrics: RunMetrics,
+                   template: Optional[ReportTemplate] = None) -> str:
+    """Формирует раздел отчета по одной печи"""
+    template = template or get_template()
+    return template.section.render(report_context(run, metrics))
+
+
+def render_report(run: FurnaceRun, metrics: RunMetrics,
+                  template: Optional[ReportTemplate] = None) -> str:
+    """Формирует текст отчета по одной печи в формате Markdown"""
+    template = template or get_template()
+    return render_header(run.date, template) + '\n' + render_section(run, metrics, template)
+
+
+def report_filename(date: str) -> str:
+    """Имя файла отчета для даты в формате дд.мм.гггг"""
+    return f'Отчет_{date.replace(".", "_")}.md'
+
+
+def build_report(run: FurnaceRun, norms: Optional[Dict] = None) -> str:
+    """Проверяет данные прогона, выполняет расчеты и возвращает текст отчета"""
+    run.validate(norms)
+    return render_report(run, compute_metrics(run, norms))
@@ -1,18 +1,26 @@
+import threading
+import time
+
+# Момент запуска процесса - для измерения времени до первого кадра
+STARTUP_TIME = time.perf_counter()
+
+# Импортируем только то, что нужно первому экрану. Хранилище, очередь
+# записи, черновик, предпросмотр и статистика печей загружаются после
+# первого кадра (start_services), календарь и окна - при первом показе.
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
 from kivy.uix.label import Label
 from kivy.uix.textinput import TextInput
 from kivy.uix.spinner import Spinner
-from datetime import datetime, timedelta
-from kivy.uix.popup import Popup
-from kivy.uix.gridlayout import GridLayout
-import calendar
-import re
 from kivy.core.window import Window
-from kivy.uix.widget import Widget
+from kivy.clock import Clock
 from kivy.lang import Builder
-from typing import Dict, List, Optional
+from kivy.logger import Logger
+import metrics
+import norms_book
+import report_core
+from report_core import NORMS, FurnaceRun
 
 # После импортов и перед Builder.load_string добавим:
 
@@ -240,131 +248,6 @@ class TimeInput(StyledFocusableTextInput):
             except ValueError:
                 pass
 
-class CalendarWidget(GridLayout):
-    """
-    Виджет календаря для выбора даты.
-    Возможности:
-    - Отображение текущего месяца
-    - Навигация по месяцам
-    - Выделение текущей даты
-    - Выбор даты кликом
-    """
-    def __init__(self, callback, **kwargs):
-        super().__init__(**kwargs)
-        self.cols = 7
-        self.callback = callback
-        self.current_date = datetime.now()
-        
-        # Создаем основной layout
-        self.main_layout = BoxLayout(orientation='vertical')
-        
-        # Создаем панель навигации
-        nav_layout = BoxLayout(size_hint_y=None, height=40)
-        
-        # Кнопки для переключения месяцев
-        self.prev_month = Button(text='<', size_hint_x=None, width=40)
-        self.next_month = Button(text='>', size_hint_x=None, width=40)
-        
-        # Метка с текущим месяцем и годом
-        self.month_year_label = Label(text=self.get_month_year_text())
-        
-        # Добавляем элементы в панель навигации
-        nav_layout.add_widget(self.prev_month)
-        nav_layout.add_widget(self.month_year_label)
-        nav_layout.add_widget(self.next_month)
-        
-        # Привязываем обработчики к кнопкам
-        self.prev_month.bind(on_press=self.previous_month)
-        self.next_month.bind(on_press=self.next_month_handler)
-        
-        # Добавляем панель навигации в основной layout
-        self.main_layout.add_widget(nav_layout)
-        
-        # Создаем grid для календаря
-        self.calendar_grid = GridLayout(cols=7)
-        self.create_calendar()
-        self.main_layout.add_widget(self.calendar_grid)
-        
-        # Добавляем основной layout
-        self.add_widget(self.main_layout)
-
-    def get_month_year_text(self):
-        """Форматирует текст с названием месяца и годом"""
-        months = ['Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
-                 'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь']
-        return f"{months[self.current_date.month - 1]} {self.current_date.year}"
-
-    def create_calendar(self):
-        """Создает календарную сетку"""
-        self.calendar_grid.clear_widgets()
-        
-        # Добавляем названия дней недели
-        for day in ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']:
-            self.calendar_grid.add_widget(Label(text=day))
-        
-        # Получаем календарь на текущий месяц
-        cal = calendar.monthcalendar(self.current_date.year, self.current_date.month)
-        
-        for week in cal:
-            for day in week:
-                if day == 0:
-                    # Пустая ячейка
-                    self.calendar_grid.add_widget(Label(text=''))
-                else:
-                    # Создаем кнопку с днем
-                    btn = Button(text=str(day))
-                    btn.bind(on_press=lambda x, d=day: self.on_day_select(d))
-                    # Выделяем текущий день
-                    if (day == datetime.now().day and 
-                        self.current_date.month == datetime.now().month and 
-                        self.current_date.year == datetime.now().year):
-                        btn.background_color = (0.5, 0.8, 0.5, 1)  # Зеленый для текущего дня
-                    self.calendar_grid.add_widget(btn)
-
-    def previous_month(self, instance):
-        """Переключает на предыдущий месяц"""
-        if self.current_date.month == 1:
-            self.current_date = self.current_date.replace(year=self.current_date.year - 1, month=12)
-        else:
-            self.current_date = self.current_date.replace(month=self.current_date.month - 1)
-        
-        self.month_year_label.text = self.get_month_year_text()
-        self.create_calendar()
-
-    def next_month_handler(self, instance):
-        """Переключает на следующий месяц"""
-        if self.current_date.month == 12:
-            self.current_date = self.current_date.replace(year=self.current_date.year + 1, month=1)
-        else:
-            self.current_date = self.current_date.replace(month=self.current_date.month + 1)
-        
-        self.month_year_label.text = self.get_month_year_text()
-        self.create_calendar()
-
-    def on_day_select(self, day):
-        """Обработчик выбора дня"""
-        date = f"{day:02d}.{self.current_date.month:02d}.{self.current_date.year}"
-        self.callback(date)
-
-# В начале файла добавим константы
-NORMS = {
-    'Печь 1': {
-        'цикл1': 510,  # 8:30 (в минутах)
-        'цикл2': 210,  # 3:30
-        'перерыв': 40,  # 0:40
-        'общее': 760   # 12:40
-    },
-    'Печь 2': {
-        'цикл1': 660,  # 11:00
-        'цикл2': 210,  # 3:30
-        'перерыв': 40,  # 0:40
-        'общее': 910   # 15:10
-    }
-}
-
-MONTHS = ['Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
-          'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь']
-
 class ReportGenerator(BoxLayout):
     """
     Основной класс генератора отчетов.
@@ -391,8 +274,32 @@ class ReportGenerator(BoxLayout):
         )
         main_container.bind(minimum_height=main_container.setter('height'))
         
-        # Нормативные значения (в минутах) для каждой печи
-        self.norms = NORMS
+        # Нормативы берутся из файла на дату прогона; список печей
+        # обновляется, когда файл нормативов меняется
+        self._refresh_event = Clock.schedule_interval(self.refresh_furnaces, 2)
+
+        # Хранилище, очередь записи, предпросмотр, черновик и статистика
+        # печей появляются после первого кадра (start_services)
+        self.store = None
+        self.writer = None
+        self.preview = None
+        self.journal = None
+        self.detector = None
+        # Прогоны, учтенные в статистике, пока она набирается по архиву
+        # (None - набор не идет); переносятся в набранную статистику
+        self._warm_pending = None
+        self._auto_notice = ''
+        # Отчеты в очереди записи: путь -> (поля формы при последней отправке,
+        # [(печь, длительности этапов)]); форма и черновик очищаются
+        # только после успешной записи
+        self._submitted = {}
+
+        # Календарь и диалоги создаются при первом показе и переиспользуются
+        self.calendar_popup = None
+        self._report_popup = None
+        self._history_popup = None
+        self._error_popup = None
+        self._success_popup = None
 
         # Создаем список всех полей ввода в порядке навигации
         self.input_fields = []
@@ -420,9 +327,10 @@ class ReportGenerator(BoxLayout):
         
         # Номер печи
         furnace_layout = BoxLayout(size_hint_y=None, height=40)
+        furnaces = self.furnace_values()
         self.furnace_spinner = StyledSpinner(
-            text='Печь 1',
-            values=('Печь 1', 'Печь 2'),
+            text=furnaces[0],
+            values=furnaces,
             size_hint_x=0.7
         )
         furnace_layout.add_widget(StyledLabel(
@@ -490,6 +398,33 @@ class ReportGenerator(BoxLayout):
         self.add_widget(self.notifications_input)
         self.input_fields.append(self.notifications_input)
 
+        # Предпросмотр отчета: обновляется после паузы в вводе,
+        # а не на каждое нажатие клавиши
+        self.add_widget(SectionLabel(text='Предпросмотр'))
+        self.preview_output = TextInput(
+            readonly=True,
+            font_size='12sp',
+            background_color=(0.97, 0.97, 0.97, 1),
+            foreground_color=(0.2, 0.2, 0.2, 1),
+            size_hint_y=None,
+            height=200
+        )
+        self.add_widget(self.preview_output)
+        self._preview_trigger = Clock.create_trigger(self.update_preview, 0.3)
+
+        # Поля черновика формы (см. start_services)
+        self.draft_fields = {
+            'date': self.date_input,
+            'furnace': self.furnace_spinner,
+            'prog1_start': self.prog1_start,
+            'prog1_end': self.prog1_end,
+            'prog2_start': self.prog2_start,
+            'prog2_end': self.prog2_end,
+            'notifications': self.notifications_input,
+        }
+        for field in self.input_fields:
+            field.bind(text=self.schedule_preview)
+
         # Привязываем обработчики событий навигации
         self.bind_navigation()
 
@@ -504,19 +439,21 @@ class ReportGenerator(BoxLayout):
         generate_button.bind(on_press=self.generate_report)
         self.add_widget(generate_button)
 
+        # История прогонов из хранилища
+        history_button = StyledButton(
+            text='ИСТОРИЯ',
+            size_hint_y=None,
+            height=40
+        )
+        history_button.bind(on_press=self.show_history)
+        self.add_widget(history_button)
+
     def calculate_time_difference(self, start_time, end_time):
         """
         Вычисляет разницу между временем начала и конца в минутах.
         Учитывает переход через полночь.
         """
-        start = datetime.strptime(start_time, '%H:%M')
-        end = datetime.strptime(end_time, '%H:%M')
-        
-        if end < start:
-            end += timedelta(days=1)
-            
-        diff = end - start
-        return diff.seconds // 60  # возвращаем разницу в минутах
+        return report_core.calculate_time_difference(start_time, end_time)
 
     def calculate_deviation(self, actual, norm):
         """
@@ -524,27 +461,46 @@ class ReportGenerator(BoxLayout):
         Положительное значение - превышение нормы
         Отрицательное значение - меньше нормы
         """
-        deviation = ((actual - norm) / norm) * 100
-        return deviation
+        return report_core.calculate_deviation(actual, norm)
 
     def format_time(self, minutes):
         """Форматирует минуты в строку ЧЧ:ММ"""
+        return report_core.format_time(minutes)
+
+    def remote_month_index(self, year, month):
+        """Сводка по дням месяца с сервиса отчетов (пусто, если он недоступен)"""
+        import report_client
+
         try:
-            hours, mins = divmod(minutes, 60)
-            return f"{int(hours):02d}:{int(mins):02d}"
-        except (TypeError, ValueError):
-            return "00:00"
+            return report_client.month_index(report_client.SERVER_URL, year, month)
+        except (OSError, report_client.ServiceError) as e:
+            Logger.error(f'ReportApp: сводка за {month:02d}.{year} не получена: {e}')
+            return {}
 
     def show_calendar(self, instance):
         """Показывает календарь для выбора даты"""
+        self.start_services()
         try:
-            content = CalendarWidget(callback=self.on_date_select)
-            self.calendar_popup = Popup(
-                title='Выберите дату',
-                content=content,
-                size_hint=(None, None),
-                size=(400, 400)
-            )
+            if self.calendar_popup is None:
+                from kivy.uix.popup import Popup
+                from calendar_widget import CalendarWidget
+
+                # Раскраска дней по индексу хранилища: своего или сервиса отчетов
+                content = CalendarWidget(
+                    callback=self.on_date_select,
+                    index=(self.store.month_index if self.store is not None
+                           else self.remote_month_index),
+                    on_open=self.show_report_popup
+                )
+                self.calendar_popup = Popup(
+                    title='Выберите дату',
+                    content=content,
+                    size_hint=(None, None),
+                    size=(400, 400)
+                )
+            else:
+                # Отчеты могли появиться после прошлого открытия
+                self.calendar_popup.content.create_calendar()
             self.calendar_popup.open()
         except Exception as e:
             self.show_error_popup(f"Ошибка при открытии календаря: {str(e)}")
@@ -567,7 +523,169 @@ class ReportGenerator(BoxLayout):
         """Очистка всех полей ввода"""
         for field in self.input_fields:
             field.text = ''
-        self.furnace_spinner.text = 'Печь 1'
+        self.furnace_spinner.text = self.furnace_spinner.values[0]
+
+    def furnace_values(self):
+        """Печи из файла нормативов (встроенные, если файл с ошибкой)"""
+        try:
+            return tuple(norms_book.furnace_names())
+        except norms_book.NormsError as e:
+            Logger.error(f'ReportApp: {e}')
+            return tuple(NORMS)
+
+    def refresh_furnaces(self, dt):
+        """Обновляет список печей после изменения файла нормативов"""
+        furnaces = self.furnace_values()
+        if furnaces != tuple(self.furnace_spinner.values):
+            self.furnace_spinner.values = furnaces
+
+    def schedule_preview(self, *args):
+        """Откладывает предпросмотр до паузы в вводе (каждое изменение сдвигает срок)"""
+        self._preview_trigger.cancel()
+        self._preview_trigger()
+
+    def start_services(self, *args):
+        """
+        Открывает хранилище и очередь записи, восстанавливает черновик
+        и набирает статистику печей. Вызывается после первого кадра
+        (ReportApp._on_first_frame), чтобы не задерживать его; действия,
+        которым нужны эти службы, вызывают его сами. Повторный вызов
+        ничего не делает.
+        """
+        if self.writer is not None:
+            return
+        import report_client
+        from anomaly_detector import AnomalyDetector
+        from draft_journal import DraftJournal
+        from report_preview import ReportPreview
+        from report_writer import ReportWriter
+
+        with metrics.span('start_services'):
+            # Файлы отчетов пишутся в фоновом потоке, результат приходит через Clock.
+            # С сервисом отчетов (T2MD_SERVER) прогоны отправляются ему,
+            # файлы и хранилище ведет сервис
+            dispatch = lambda func: Clock.schedule_once(lambda dt: func())
+            if report_client.SERVER_URL:
+                self.writer = report_client.RemoteReportWriter(
+                    report_client.SERVER_URL, on_result=self.on_report_written, dispatch=dispatch)
+            else:
+                from run_store import DEFAULT_DB_PATH, RunStore
+
+                # Хранилище структурированных данных всех прогонов: здесь
+                # только чтение (календарь, история), прогоны сохраняет
+                # поток записи после записи файла отчета
+                self.store = RunStore(DEFAULT_DB_PATH)
+                self.writer = ReportWriter(on_result=self.on_report_written, dispatch=dispatch,
+                                           store_path=DEFAULT_DB_PATH)
+
+            # Статистика прогонов печей для предупреждений о необычных прогонах
+            self.detector = AnomalyDetector()
+            self.preview = ReportPreview()
+
+            # Черновик формы: восстанавливаем введенное до сбоя, затем
+            # записываем каждое изменение полей в журнал
+            self.journal = DraftJournal()
+            draft = self.journal.restore()
+            for name, value in draft.items():
+                if name in self.draft_fields:
+                    self.draft_fields[name].text = value
+            # Предупреждение, подставленное в уведомления до сбоя, остается
+            # предупреждением, а не текстом оператора (см. update_notice)
+            self._auto_notice = draft.get('auto_notice', '')
+            for name, widget in self.draft_fields.items():
+                widget.bind(text=lambda instance, value, name=name: self.journal.record(name, value))
+            self.journal.start()
+        self.schedule_preview()
+        self.warm_start_detector()
+
+    def warm_start_detector(self):
+        """
+        Набирает статистику печей по архиву прогонов в фоновом потоке
+        (со своим соединением с хранилищем); готовая статистика заменяет
+        пустую в главном потоке
+        """
+        if self.store is None:
+            return
+        self._warm_pending = []
+        threading.Thread(target=self._warm_start_worker, args=(self.store.path,),
+                         name='DetectorWarmStart', daemon=True).start()
+
+    def _warm_start_worker(self, path):
+        from anomaly_detector import AnomalyDetector
+        from run_store import RunStore
+
+        detector = AnomalyDetector()
+        try:
+            with metrics.span('detector_warm_start'), RunStore(path) as store:
+                count = detector.warm_start(store)
+        except Exception as e:
+            Logger.error(f'ReportApp: статистика печей не набрана: {e}')
+            detector, count = None, 0
+        Clock.schedule_once(lambda dt: self._set_detector(detector, count))
+
+    def _set_detector(self, detector, count):
+        """Заменяет статистику набранной по архиву (None - набрать не удалось)"""
+        pending, self._warm_pending = self._warm_pending or [], None
+        if detector is None:
+            return
+        # Прогоны, записанные во время набора, иначе потерялись бы
+        for furnace, durations in pending:
+            detector.update(furnace, durations)
+        self.detector = detector
+        Logger.info(f'ReportApp: статистика печей по {count} прогонам')
+        # Восстановленный черновик проверяется уже с учетом статистики
+        self.schedule_preview()
+
+    def update_notice(self):
+        """
+        Заполняет уведомления предупреждением, если прогон необычен
+        для этой печи. Текст, введенный оператором, не заменяется.
+        """
+        from anomaly_detector import stage_durations
+
+        try:
+            run = self.collect_run()
+            notice = self.detector.warnings_text(run.furnace, stage_durations(norms_book.evaluate(run)))
+        except ValueError:
+            notice = ''
+        if self.notifications_input.text in ('', self._auto_notice):
+            if notice != self._auto_notice:
+                # Сначала журнал узнает, что текст поля - предупреждение,
+                # затем меняется само поле (оно тоже пишется в журнал)
+                self.journal.record('auto_notice', notice)
+                self._auto_notice = notice
+            self.notifications_input.text = notice
+
+    def update_preview(self, *args):
+        """Перерисовывает предпросмотр (только изменившиеся части отчета)"""
+        if self.preview is None:
+            return
+        with metrics.span('preview'):
+            self.update_notice()
+            self.preview_output.text = self.preview.render(
+                self.date_input.text,
+                self.furnace_spinner.text,
+                self.prog1_start.text,
+                self.prog1_end.text,
+                self.prog2_start.text,
+                self.prog2_end.text,
+                self.notifications_input.text,
+            )
+
+    def collect_run(self):
+        """
+        Собирает данные прогона из полей формы.
+        При незаполненных полях или неверном формате времени выбрасывает ValueError.
+        """
+        return FurnaceRun.from_text(
+            date=self.date_input.text,
+            furnace=self.furnace_spinner.text,
+            prog1_start=self.prog1_start.text,
+            prog1_end=self.prog1_end.text,
+            prog2_start=self.prog2_start.text,
+            prog2_end=self.prog2_end.text,
+            notifications=self.notifications_input.text,
+        )
 
     def generate_report(self, instance):
         """
@@ -575,127 +693,158 @@ class ReportGenerator(BoxLayout):
         Выполняет:
         1. Проверку заполнения всех полей
         2. Расчет времени этапов и отклонений
-        3. Формирование отчета по шаблону
-        4. Сохранение в файл
-        5. Очистку полей после успешной генерации
+        3. Постановку раздела печи в очередь фоновой записи
+           (формирование по шаблону, запись в файл отчета за дату,
+           затем сохранение прогона в хранилище)
+        Поля и черновик очищает on_report_written после успешной записи.
         """
+        from anomaly_detector import stage_durations
+
+        self.start_services()
         try:
-            # Проверка заполнения всех полей
-            if not all([self.date_input.text, self.prog1_start.text, self.prog1_end.text,
-                       self.prog2_start.text, self.prog2_end.text]):
-                raise ValueError("Пожалуйста, заполните все поля времени")
-
-            # Проверка формата времени
-            time_fields = [self.prog1_start.text, self.prog1_end.text,
-                          self.prog2_start.text, self.prog2_end.text]
-            for field in time_fields:
-                if not re.match(r'^([01]\d|2[0-3]):([0-5]\d)$', field):
-                    raise ValueError("Неверный формат времени. Используйте ЧЧ:ММ")
-
-            # Получаем нормативы для выбранной печи
-            current_norms = self.norms[self.furnace_spinner.text]
-            
-            # Рассчитываем времена программ
-            program1_time = self.calculate_time_difference(
-                self.prog1_start.text,
-                self.prog1_end.text
-            )
-            
-            program2_time = self.calculate_time_difference(
-                self.prog2_start.text,
-                self.prog2_end.text
-            )
-            
-            # Рассчитываем этапы и перерыв
-            stage1_time = program1_time  # Этап 1 соответствует времени Программы 1
-            stage2_time = program2_time  # Этап 2 соответствует времени Программы 2
-            
-            # Рассчитываем перерыв как разницу между концом Программы 1 и началом Программы 2
-            break_time = self.calculate_time_difference(
-                self.prog1_end.text,
-                self.prog2_start.text
-            )
-            
-            # Общее время - сумма всех этапов и перерыва
-            total_time = stage1_time + stage2_time + break_time
-
-            # Вычисляем отклонения
-            stage1_dev = self.calculate_deviation(stage1_time, current_norms['цикл1'])
-            stage2_dev = self.calculate_deviation(stage2_time, current_norms['цикл2'])
-            break_dev = self.calculate_deviation(break_time, current_norms['перерыв'])
-            total_dev = self.calculate_deviation(total_time, current_norms['общее'])
-
-            # Обновляем шаблон отчета, добавляя пользовательские уведомления
-            notifications = self.notifications_input.text.strip()
-            if not notifications:
-                notifications = "Всё отработало в штатном режиме"
-
-            # Формируем отчет
-            report_template = f"""🔥 **ИНФОРМАЦИЯ ПО ТЕРМООБРАБОТКЕ** 🔥  
-                    **за**  **{self.date_input.text}**  
-🏭 **Литейный цех | Ответственный: Федотов А.А.**
-▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬  
-🔘 **{self.furnace_spinner.text}** | 📶 **Статус: Активна**
-┌───────────────┬───────────────┐  
-│ **Программа 1**              │ **Программа 2**             │  
-├───────────────┼───────────────┤  
-│ 🕖 ВКЛ: `{self.prog1_start.text}`           │ 🕖 ВКЛ: `{self.prog2_start.text}`          │  
-│ 🕚 ВЫКЛ: `{self.prog1_end.text}`        │ 🕚 ВЫКЛ: `{self.prog2_end.text}`       │  
-└───────────────┴───────────────┘  
-▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬  
-📊 **АНАЛИТИКА**
-• 🟢 Этап 1: `{self.format_time(stage1_time)}` ({self.get_deviation_symbol(stage1_dev)} **{stage1_dev:.2f}%** от установленной **нормы**)  
-• 🟡 Этап 2: `{self.format_time(stage2_time)}` ({self.get_deviation_symbol(stage2_dev)} **{stage2_dev:.2f}%** от установленной **нормы**)  
-• ⏸️ Перерыв: `{self.format_time(break_time)}`  ({self.get_deviation_symbol(break_dev)} **{break_dev:.2f}%** от установленной **нормы**)
-• 📌 **Общее время: {self.format_time(total_time)}** ({self.get_deviation_symbol(total_dev)} **{total_dev:.2f}%** от установленной **нормы**)
-▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬  
-🚨 **УВЕДОМЛЕНИЯ**
-⚠️ **{notifications}**
-✅ **`Термообработка: ▰▰▰▰ 100%`**
-▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬▬"""
-
-            # Сохраняем отчет в файл
-            with open(f'Отчет_{self.date_input.text.replace(".", "_")}.md', 'w', encoding='utf-8') as f:
-                f.write(report_template)
-
-            # Очищаем поля после успешной генерации отчета
-            self.clear_fields()
-            
-            # Показываем сообщение об успешной генерации
-            self.show_success_popup()
+            # Проверка полей, расчет этапов и отклонений
+            with metrics.span('validate'):
+                run = self.collect_run()
+                norms = norms_book.norms_for(run.date)
+                run.validate(norms)
+            with metrics.span('calculate'):
+                run_metrics = report_core.compute_metrics(run, norms)
+
+            # Ставим раздел печи в очередь записи в отчет за дату,
+            # разделы других печей при этом не затрагиваются
+            path = report_core.report_filename(run.date)
+            _, runs = self._submitted.get(path, (None, []))
+            runs.append((run.furnace, stage_durations(run_metrics)))
+            self._submitted[path] = (self.form_values(), runs)
+            self.writer.submit(path, run, run_metrics)
 
         except ValueError as ve:
+            metrics.count('validation_errors')
             self.show_error_popup(str(ve))
         except Exception as e:
+            metrics.count('errors')
             self.show_error_popup(f"Неожиданная ошибка: {str(e)}")
 
+    def form_values(self):
+        """Текущие значения полей формы по именам черновика"""
+        return {name: widget.text for name, widget in self.draft_fields.items()}
+
+    def on_report_written(self, path, error):
+        """
+        Результат фоновой записи отчета (вызывается в главном потоке).
+        При ошибке форма и черновик остаются нетронутыми, прогон можно
+        отправить повторно.
+        """
+        # Разделы, отправленные во время записи, еще в очереди: форму
+        # и черновик разберет результат их записи
+        submitted = None if self.writer.is_queued(path) else self._submitted.pop(path, None)
+        if error is not None:
+            self.show_error_popup(f"Не удалось сохранить отчет {path}: {error}")
+            return
+        if submitted is not None:
+            values, runs = submitted
+            for furnace, durations in runs:
+                self.detector.update(furnace, durations)
+                if self._warm_pending is not None:
+                    self._warm_pending.append((furnace, durations))
+            # Если оператор уже начал ввод следующего прогона, форму не трогаем
+            if self.form_values() == values:
+                self.clear_fields()
+                self._auto_notice = ''
+                self.journal.clear()
+        self.show_success_popup()
+
+    def close(self):
+        """Дописывает отчеты из очереди и черновик, останавливает фоновые задачи"""
+        self._refresh_event.cancel()
+        self._preview_trigger.cancel()
+        if self.writer is not None:
+            self.writer.close()
+            self.journal.close()
+        if self.store is not None:
+            self.store.close()
+
     def get_deviation_symbol(self, deviation):
         """Возвращает символ отклонения в зависимости от значения"""
-        if deviation > 0:
-            return "🔺"
-        elif deviation < 0:
-            return "🔻"
-        return "❎"
+        return report_core.get_deviation_symbol(deviation)
 
     def show_error_popup(self, message):
         """Показывает всплывающее окно с ошибкой"""
-        popup = Popup(
-            title='Ошибка',
-            content=Label(text=message),
-            size_hint=(None, None),
-            size=(400, 200)
-        )
-        popup.open()
+        if self._error_popup is None:
+            from kivy.uix.popup import Popup
+
+            self._error_popup = Popup(
+                title='Ошибка',
+                content=Label(),
+                size_hint=(None, None),
+                size=(400, 200)
+            )
+        self._error_popup.content.text = message
+        self._error_popup.open()
 
     def show_success_popup(self):
         """Показывает всплывающее окно об успехе"""
-        popup = Popup(
-            title='Успех',
-            content=Label(text='Отчет успешно сгенерирован'),
-            size_hint=(None, None),
-            size=(300, 150)
-        )
-        popup.open()
+        if self._success_popup is None:
+            from kivy.uix.popup import Popup
+
+            self._success_popup = Popup(
+                title='Успех',
+                content=Label(text='Отчет успешно сгенерирован'),
+                size_hint=(None, None),
+                size=(300, 150)
+            )
+        self._success_popup.open()
+
+    def show_report_popup(self, date):
+        """Показывает сохраненный отчет за дату"""
+        import report_archive
+        import report_client
+
+        try:
+            if report_client.SERVER_URL:
+                text = report_client.fetch_report(report_client.SERVER_URL, date)
+            else:
+                text = report_archive.read_report(report_core.report_filename(date))
+        except (OSError, ValueError) as e:
+            self.show_error_popup(f"Не удалось открыть отчет за {date}: {e}")
+            return
+        if text is None:
+            self.show_error_popup(f"Нет отчета за {date}")
+            return
+
+        if self._report_popup is None:
+            from kivy.uix.popup import Popup
+
+            self._report_popup = Popup(
+                content=TextInput(readonly=True, font_size='12sp'),
+                size_hint=(0.95, 0.9)
+            )
+        self._report_popup.title = f"Отчет за {date}"
+        self._report_popup.content.text = text
+        self._report_popup.open()
+
+    def show_history(self, instance):
+        """Показывает историю прогонов"""
+        self.start_services()
+        if self.store is None:
+            self.show_error_popup("История доступна только при локальном хранилище")
+            return
+        try:
+            if self._history_popup is None:
+                from kivy.uix.popup import Popup
+                from history_view import HistoryView
+
+                self._history_popup = Popup(
+                    title='История прогонов',
+                    content=HistoryView(self.store),
+                    size_hint=(0.95, 0.9)
+                )
+            else:
+                # Могли добавиться новые прогоны
+                self._history_popup.content.apply_filters()
+            self._history_popup.open()
+        except Exception as e:
+            self.show_error_popup(f"Ошибка при открытии истории: {str(e)}")
 
     def bind_navigation(self):
         """
@@ -713,10 +862,29 @@ class ReportGenerator(BoxLayout):
 
 class ReportApp(App):
     """Основной класс приложения"""
+    # Время от запуска процесса до первого отрисованного кадра (в секундах)
+    time_to_first_frame = None
+
     def build(self):
         # Устанавливаем размер окна
         Window.size = (600, 800)  # Ширина: 800, Высота: 900
-        return ReportGenerator()
+        with metrics.span('build'):
+            return ReportGenerator()
+
+    def on_stop(self):
+        # Дописываем отчеты, оставшиеся в очереди, и черновик
+        self.root.close()
+
+    def on_start(self):
+        Window.bind(on_draw=self._on_first_frame)
+
+    def _on_first_frame(self, *args):
+        """Фиксирует время до первого кадра и отключает обработчик"""
+        Window.unbind(on_draw=self._on_first_frame)
+        self.time_to_first_frame = time.perf_counter() - STARTUP_TIME
+        metrics.observe('startup', self.time_to_first_frame)
+        Logger.info(f'ReportApp: первый кадр через {self.time_to_first_frame:.3f} с')
+        Clock.schedule_once(self.root.start_services)
 
 if __name__ == '__main__':
     ReportApp().run() 
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+Предпросмотр отчета по мере ввода.
+
+ReportPreview хранит отрисованные части отчета вместе с входными
+данными, по которым они получены: шапка зависит от даты и шаблона,
+раздел печи - от даты, печи, отметок времени, уведомлений, шаблона
+и нормативов. Шаблон и нормативы входят в ключ как объекты: после
+перечитывания измененного файла это уже другой объект.
+При обновлении заново рассчитывается и отрисовывается только та часть,
+чьи входные данные изменились. Ошибки ввода показываются вместо раздела,
+чтобы оператор увидел их до записи файла.
+"""
+from typing import Optional
+
+import norms_book
+import report_core
+from report_core import FurnaceRun
+
+
+class ReportPreview:
+    def __init__(self):
+        self._header_key: Optional[tuple] = None
+        self._header = ''
+        self._section_key: Optional[tuple] = None
+        self._section = ''
+        self.renders = 0  # сколько раз отрисовывался раздел печи
+
+    def header(self, date_text: str) -> str:
+        """Шапка отчета за дату (пусто, пока дата не введена полностью)"""
+        template = report_core.get_template()
+        key = (date_text, template)
+        if key != self._header_key:
+            self._header_key = key
+            try:
+                report_core.parse_date(date_text)
+                self._header = report_core.render_header(date_text, template)
+            except ValueError:
+                self._header = ''
+        return self._header
+
+    def section(self, date_text: str, furnace: str, prog1_start: str, prog1_end: str,
+                prog2_start: str, prog2_end: str, notifications: str) -> str:
+        """Раздел печи или описание ошибки ввода"""
+        values = (date_text, furnace, prog1_start, prog1_end, prog2_start, prog2_end, notifications)
+        try:
+            book = norms_book.get_norms_book()
+        except (OSError, ValueError) as e:
+            return f"⚠️ {e}"
+        template = report_core.get_template()
+        key = values + (book, template)
+        if key != self._section_key:
+            self._section_key = key
+            self._section = self._render_section(values, book, template)
+        return self._section
+
+    def _render_section(self, values, book, template) -> str:
+        self.renders += 1
+        try:
+            run = FurnaceRun.from_text(*values)
+            norms = book.for_date(run.date)
+            run.validate(norms)
+            run_metrics = report_core.compute_metrics(run, norms)
+        except ValueError as e:
+            return f"⚠️ {e}"
+        return report_core.render_section(run, run_metrics, template)
+
+    def render(self, date_text: str, furnace: str, prog1_start: str, prog1_end: str,
+               prog2_start: str, prog2_end: str, notifications: str) -> str:
+        """Текст предпросмотра: шапка и раздел печи"""
+        if not any((date_text, prog1_start, prog1_end, prog2_start, prog2_end, notifications)):
+            return ''
+        header = self.header(date_text)
+        section = self.section(date_text, furnace, prog1_start, prog1_end,
+                               prog2_start, prog2_end, notifications)
+        return f"{header}\n{section}" if header else section
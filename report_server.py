@@ -0,0 +1,364 @@
+"""
+Локальный HTTP-сервис приема и выдачи отчетов на asyncio.
+
+Несколько рабочих мест отправляют прогоны одному сервису, и только он
+пишет файлы Отчет_<дата>.md, поэтому гонок за общий файл нет:
+- записи в файл одной даты выполняются строго по очереди
+- отправки в одну дату, пришедшие за batch_delay, объединяются
+  в одну загрузку, отрисовку и запись файла
+- готовый текст отчетов кешируется и выдается без чтения файла,
+  пока не изменится время изменения файла
+
+HTTP-протокол реализован на asyncio.start_server без внешних зависимостей:
+    POST /runs                  прогон (объект JSON с полями FurnaceRun)
+                                или {"runs": [...]}; ответ {"reports": [...]}
+    GET  /reports[?from=&to=]   список отчетов (даты дд.мм.гггг)
+    GET  /reports/<дд.мм.гггг>  текст отчета (text/markdown)
+    GET  /days?month=мм.гггг    сводка хранилища по дням месяца для календаря:
+                                {"days": {"<день>": [прогонов, макс. откл., мин. откл.]}}
+
+Пример:
+    python report_server.py -o reports/ --host 0.0.0.0 --port 8765
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import norms_book
+import report_archive
+import report_core
+from daily_report import DailyReport, section_key
+from report_core import FurnaceRun, RunMetrics
+from run_store import DEFAULT_DB_PATH, RunStore
+
+DEFAULT_PORT = 8765
+
+# Ограничение размера тела запроса
+MAX_BODY = 1024 * 1024
+
+# Сколько отчетов держать в кеше готового текста
+CACHE_SIZE = 256
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+            405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class _DayBatch:
+    """Прогоны, ожидающие записи в файл одной даты"""
+    __slots__ = ('date', 'runs', 'waiters')
+
+    def __init__(self, date_text: str):
+        self.date = date_text
+        self.runs: Dict[str, Tuple[FurnaceRun, RunMetrics]] = {}
+        self.waiters: List[asyncio.Future] = []
+
+
+class ReportService:
+    """
+    Прием прогонов и выдача отчетов. Блокирующий ввод-вывод выполняется
+    в пуле потоков; хранилище SQLite - в отдельном потоке, где оно создано.
+    """
+    def __init__(self, output_dir: str = '.', db_path: Optional[str] = DEFAULT_DB_PATH,
+                 batch_delay: float = 0.05):
+        self.output_dir = output_dir
+        self.batch_delay = batch_delay
+        self._batches: Dict[str, _DayBatch] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # путь -> (st_mtime_ns, текст отчета)
+        self._cache: 'OrderedDict[str, Tuple[int, str]]' = OrderedDict()
+        self._tasks = set()
+        self._io = ThreadPoolExecutor(max_workers=4, thread_name_prefix='report-io')
+        self._db = ThreadPoolExecutor(max_workers=1, thread_name_prefix='report-db')
+        self._store: Optional[RunStore] = None
+        if db_path is not None:
+            self._store = self._db.submit(RunStore, db_path).result()
+
+    def close(self):
+        if self._store is not None:
+            self._db.submit(self._store.close).result()
+        self._db.shutdown()
+        self._io.shutdown()
+
+    def path_for(self, date_text: str) -> str:
+        return os.path.join(self.output_dir, report_core.report_filename(date_text))
+
+    async def submit(self, runs: List[FurnaceRun]) -> List[str]:
+        """
+        Рассчитывает прогоны по нормативам на их даты, записывает разделы
+        в отчеты и после записи сохраняет прогоны в хранилище. Если хотя бы
+        один прогон не проходит проверку, не записывается ничего (ValueError).
+        Возвращает имена файлов отчетов после их записи.
+        """
+        evaluated = [(run, norms_book.evaluate(run)) for run in runs]
+        loop = asyncio.get_running_loop()
+        waiters = []
+        for run, run_metrics in evaluated:
+            path = self.path_for(run.date)
+            batch = self._batches.get(path)
+            if batch is None:
+                batch = self._batches[path] = _DayBatch(run.date)
+                loop.call_later(self.batch_delay, self._start_flush, path)
+            batch.runs[section_key(run.furnace)] = (run, run_metrics)
+            waiter = loop.create_future()
+            batch.waiters.append(waiter)
+            waiters.append(waiter)
+
+        await asyncio.gather(*waiters)
+        return sorted({os.path.basename(self.path_for(run.date)) for run in runs})
+
+    def _start_flush(self, path: str):
+        task = asyncio.ensure_future(self._flush(path))
+        # Держим ссылку на задачу до ее завершения
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, path: str):
+        """Записывает накопленные разделы даты; записи одного файла идут по очереди"""
+        loop = asyncio.get_running_loop()
+        lock = self._locks.setdefault(path, asyncio.Lock())
+        async with lock:
+            batch = self._batches.pop(path)
+            try:
+                entry = await loop.run_in_executor(self._io, self._write, path, batch)
+                self._remember(path, entry)
+                # Прогон попадает в хранилище только вместе с записанным отчетом
+                if self._store is not None:
+                    await loop.run_in_executor(
+                        self._db, self._store.save_many, list(batch.runs.values()))
+            except Exception as e:
+                for waiter in batch.waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+                return
+            for waiter in batch.waiters:
+                if not waiter.done():
+                    waiter.set_result(path)
+
+    @staticmethod
+    def _write(path: str, batch: _DayBatch) -> Tuple[int, str]:
+        report = DailyReport.load(path, batch.date)
+        for run, run_metrics in batch.runs.values():
+            report.set_run(run, run_metrics)
+        text = report.save(path)
+        return os.stat(path).st_mtime_ns, text
+
+    def _remember(self, path: str, entry: Tuple[int, str]):
+        self._cache[path] = entry
+        self._cache.move_to_end(path)
+        while len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    async def get_report(self, date_text: str) -> Optional[str]:
+        """Текст отчета за дату или None"""
+        path = self.path_for(date_text)
+        # Дожидаемся записи, если она сейчас идет
+        lock = self._locks.get(path)
+        if lock is not None and lock.locked():
+            async with lock:
+                pass
+        cached = self._cache.get(path)
+        try:
+            entry = await asyncio.get_running_loop().run_in_executor(
+                self._io, _read_if_changed, path, cached)
+        except FileNotFoundError:
+            self._cache.pop(path, None)
+            return None
+        self._remember(path, entry)
+        return entry[1]
+
+    async def month_index(self, year: int, month: int) -> Dict[int, Tuple[int, float, float]]:
+        """Сводка хранилища по дням месяца (пусто, если сервис без хранилища)"""
+        if self._store is None:
+            return {}
+        return await asyncio.get_running_loop().run_in_executor(
+            self._db, self._store.month_index, year, month)
+
+    def list_reports(self, start=None, end=None) -> List[str]:
+        """Даты (дд.мм.гггг) отчетов в каталоге, по возрастанию"""
+        return [report_core.format_date(report_date)
+                for report_date in report_archive.report_dates(self.output_dir, start, end)]
+
+
+def _read_if_changed(path: str, cached: Optional[Tuple[int, str]]) -> Tuple[int, str]:
+    """Читает файл, если он изменился после кешированной версии"""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        # Отчет закрытого месяца - в архиве
+        return report_archive.read_archived(path)
+    if cached is not None and cached[0] == mtime:
+        return cached
+    with open(path, encoding='utf-8') as f:
+        return mtime, f.read()
+
+
+def _run_from_json(data) -> FurnaceRun:
+    if not isinstance(data, dict):
+        raise ValueError("Прогон должен быть объектом JSON")
+    values = {name: str(data.get(name) or '').strip() for name in FurnaceRun.FIELDS}
+    return FurnaceRun.from_text(**values)
+
+
+class ReportServer:
+    """HTTP/1.1 поверх asyncio.start_server с маршрутами ReportService"""
+    def __init__(self, service: ReportService):
+        self.service = service
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body, error = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                try:
+                    if error is not None:
+                        # Тело не прочитано, соединение дальше не используется
+                        keep_alive = False
+                        raise error
+                    status, content_type, payload = await self.route(method, target, body)
+                except HTTPError as e:
+                    status, content_type, payload = e.status, 'application/json', _json({'error': str(e)})
+                except ValueError as e:
+                    status, content_type, payload = 400, 'application/json', _json({'error': str(e)})
+                except Exception as e:
+                    status, content_type, payload = 500, 'application/json', _json({'error': str(e)})
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1')
+                    + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            return None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            return method.upper(), target, headers, None, HTTPError(400, 'Неверный Content-Length')
+        if length > MAX_BODY:
+            return method.upper(), target, headers, None, HTTPError(413, 'Слишком большой запрос')
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target, headers, body, None
+
+    async def route(self, method: str, target: str, body: bytes):
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+
+        if parts == ['runs']:
+            if method != 'POST':
+                raise HTTPError(405, 'Используйте POST')
+            try:
+                data = json.loads(body.decode('utf-8'))
+            except (UnicodeDecodeError, json.JSONDecodeError) as e:
+                raise HTTPError(400, f"Неверный JSON: {e}") from None
+            items = data['runs'] if isinstance(data, dict) and 'runs' in data else [data]
+            if not isinstance(items, list):
+                raise HTTPError(400, 'Поле runs должно быть списком прогонов')
+            reports = await self.service.submit([_run_from_json(item) for item in items])
+            return 200, 'application/json', _json({'reports': reports})
+
+        if parts and parts[0] == 'reports' and method == 'GET':
+            if len(parts) == 1:
+                query = parse_qs(url.query)
+                start = query.get('from', [None])[0]
+                end = query.get('to', [None])[0]
+                dates = self.service.list_reports(
+                    report_core.parse_date(start) if start else None,
+                    report_core.parse_date(end) if end else None)
+                return 200, 'application/json', _json({'reports': dates})
+            if len(parts) == 2:
+                text = await self.service.get_report(report_core.normalize_date(parts[1]))
+                if text is None:
+                    raise HTTPError(404, f"Нет отчета за {parts[1]}")
+                return 200, 'text/markdown; charset=utf-8', text.encode('utf-8')
+        if parts == ['days'] and method == 'GET':
+            month = parse_qs(url.query).get('month', [''])[0]
+            try:
+                first_day = report_core.parse_date(f"01.{month}")
+            except ValueError:
+                raise HTTPError(400, 'Укажите месяц: ?month=мм.гггг') from None
+            days = await self.service.month_index(first_day.year, first_day.month)
+            return 200, 'application/json', _json({'days': days})
+        if parts and parts[0] in ('runs', 'reports', 'days'):
+            raise HTTPError(405, 'Метод не поддерживается')
+        raise HTTPError(404, 'Неизвестный адрес')
+
+
+def _json(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+async def serve(service: ReportService, host: str = '127.0.0.1', port: int = DEFAULT_PORT):
+    """Запускает сервер и возвращает asyncio.Server"""
+    server = ReportServer(service)
+    return await asyncio.start_server(server.handle, host, port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='HTTP-сервис приема и выдачи отчетов')
+    parser.add_argument('-o', '--output-dir', default='.', help='каталог отчетов')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH,
+                        help=f'хранилище прогонов (по умолчанию {DEFAULT_DB_PATH})')
+    parser.add_argument('--no-db', action='store_true', help='не сохранять прогоны в хранилище')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='адрес (0.0.0.0 - доступ из локальной сети)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    service = ReportService(args.output_dir, None if args.no_db else args.db)
+
+    async def run():
+        server = await serve(service, args.host, args.port)
+        print(f"Сервис отчетов: http://{args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Компилируемые шаблоны отчетов.
+
+Шаблон - обычный Markdown-файл (Шаблон.md) с плейсхолдерами вида
+{{ имя }} или {{ имя | фильтр }}. Файл разбирается один раз в список
+сегментов: готовые куски текста и ссылки на значения с фильтрами.
+Отрисовка сводится к склейке сегментов. Скомпилированный шаблон
+кешируется по времени изменения файла, поэтому правки подхватываются
+без перезапуска.
+
+Строка <!-- ПЕЧЬ --> отделяет шапку отчета от раздела одной печи.
+Остальные строки, целиком состоящие из HTML-комментария, в отчет
+не попадают.
+"""
+import os
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+PLACEHOLDER = re.compile(r'{{\s*(?P<name>\w+)\s*(?:\|\s*(?P<filter>\w+)\s*)?}}')
+COMMENT_LINE = re.compile(r'^[ \t]*<!--.*-->[ \t]*(?:\n|$)', re.MULTILINE)
+SECTION_MARKER = '<!-- ПЕЧЬ -->'
+
+# Фильтры форматирования значений, регистрируются через register_filter
+FILTERS: Dict[str, Callable] = {
+    'upper': lambda value: str(value).upper(),
+}
+
+
+def register_filter(name: str, func: Callable):
+    """Регистрирует фильтр, доступный в шаблонах как {{ значение | name }}"""
+    FILTERS[name] = func
+
+
+class TemplateError(ValueError):
+    """Ошибка в тексте шаблона"""
+
+
+class CompiledTemplate:
+    """
+    Шаблон, разобранный на сегменты.
+    literals всегда на один элемент длиннее fields: текст, поле, текст, ...
+    """
+    def __init__(self, literals: List[str], fields: List[Tuple[str, Optional[Callable]]]):
+        self.literals = literals
+        self.fields = fields
+
+    @property
+    def names(self):
+        """Имена значений, используемых шаблоном"""
+        return {name for name, _ in self.fields}
+
+    def render(self, context: Dict) -> str:
+        literals = self.literals
+        parts = [literals[0]]
+        for i, (name, func) in enumerate(self.fields, start=1):
+            value = context[name]
+            parts.append(func(value) if func is not None else str(value))
+            parts.append(literals[i])
+        return ''.join(parts)
+
+
+def compile_template(text: str) -> CompiledTemplate:
+    """Разбирает текст шаблона на сегменты"""
+    literals, fields = [], []
+    pos = 0
+    for match in PLACEHOLDER.finditer(text):
+        literals.append(text[pos:match.start()])
+        filter_name = match.group('filter')
+        if filter_name is None:
+            func = None
+        elif filter_name in FILTERS:
+            func = FILTERS[filter_name]
+        else:
+            raise TemplateError(f"Неизвестный фильтр шаблона: {filter_name}")
+        fields.append((match.group('name'), func))
+        pos = match.end()
+    literals.append(text[pos:])
+    return CompiledTemplate(literals, fields)
+
+
+class ReportTemplate:
+    """Шаблон отчета: шапка и раздел печи"""
+    def __init__(self, header: CompiledTemplate, section: CompiledTemplate):
+        self.header = header
+        self.section = section
+
+    @classmethod
+    def from_text(cls, text: str) -> 'ReportTemplate':
+        text = text.replace('\r\n', '\n')
+        if SECTION_MARKER not in text:
+            raise TemplateError(f"В шаблоне нет строки {SECTION_MARKER}")
+        header, section = text.split(SECTION_MARKER, 1)
+        header = COMMENT_LINE.sub('', header).rstrip('\n')
+        section = COMMENT_LINE.sub('', section.lstrip('\n')).rstrip()
+        return cls(compile_template(header), compile_template(section))
+
+
+_cache: Dict[str, Tuple[int, ReportTemplate]] = {}
+
+
+def load_template(path: str) -> ReportTemplate:
+    """
+    Возвращает скомпилированный шаблон из файла.
+    Повторная компиляция выполняется только после изменения файла.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, encoding='utf-8') as f:
+        template = ReportTemplate.from_text(f.read())
+    _cache[path] = (mtime, template)
+    return template
@@ -0,0 +1,182 @@
+"""
+Фоновая запись отчетов.
+
+Запись файла отчета (особенно на сетевой диск) может занимать секунды,
+поэтому графический интерфейс только ставит раздел печи в очередь,
+а запись выполняет отдельный поток:
+- каждая запись атомарна (временный файл + переименование)
+- частые отправки в один и тот же файл объединяются в одну запись
+- неудачная запись повторяется с нарастающей паузой
+- после успешной записи файла прогоны сохраняются в хранилище
+  (store_path) тем же потоком, через свое соединение SQLite
+- результат передается обратно через dispatch (в Kivy - Clock.schedule_once)
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import metrics
+from daily_report import DailyReport, section_key
+from report_core import FurnaceRun, RunMetrics
+from run_store import RunStore
+
+
+class _Job:
+    """Накопленные разделы одного файла отчета"""
+    __slots__ = ('runs', 'attempts', 'not_before')
+
+    def __init__(self, not_before: float):
+        self.runs: Dict[str, tuple] = {}
+        self.attempts = 0
+        self.not_before = not_before
+
+
+class ReportWriter:
+    """
+    Поток записи ежедневных отчетов.
+
+    on_result(path, error) вызывается после успешной записи (error=None)
+    или после исчерпания попыток (error - последнее исключение).
+    dispatch(func) определяет, в каком потоке вызывается on_result;
+    по умолчанию - прямо в потоке записи. С store_path прогоны
+    записанного отчета сохраняются в хранилище прогонов; ошибка
+    хранилища передается в on_result так же, как ошибка записи.
+    """
+    def __init__(self, on_result: Optional[Callable] = None,
+                 dispatch: Optional[Callable] = None,
+                 store_path: Optional[str] = None,
+                 coalesce_delay: float = 0.2,
+                 retry_delay: float = 1.0,
+                 max_retry_delay: float = 30.0,
+                 max_attempts: int = 5):
+        self.on_result = on_result
+        self.dispatch = dispatch or (lambda func: func())
+        self.coalesce_delay = coalesce_delay
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        self.store_path = store_path
+        self._store: Optional[RunStore] = None
+
+        self._pending: Dict[str, _Job] = {}
+        self._writing: Optional[str] = None
+        self._busy = 0
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, name='ReportWriter', daemon=True)
+        self._thread.start()
+
+    def submit(self, path: str, run: FurnaceRun, run_metrics: RunMetrics):
+        """Ставит раздел печи в очередь на запись в файл отчета"""
+        with self._cond:
+            job = self._pending.get(path)
+            if job is None:
+                job = self._pending[path] = _Job(time.monotonic() + self.coalesce_delay)
+            job.runs[section_key(run.furnace)] = (run, run_metrics)
+            self._cond.notify()
+
+    def is_queued(self, path: str) -> bool:
+        """Есть ли для файла отчета еще не записанные разделы"""
+        with self._cond:
+            return path in self._pending or path == self._writing
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Ждет записи всех поставленных в очередь отчетов
+        (с учетом повторных попыток). Возвращает False по таймауту.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            for job in self._pending.values():
+                job.not_before = min(job.not_before, time.monotonic())
+            self._cond.notify()
+            while self._pending or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = 10.0) -> bool:
+        """Дописывает очередь и останавливает поток"""
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        return flushed
+
+    def _next_job(self):
+        """Выбирает готовую к записи задачу, ожидая ее при необходимости"""
+        with self._cond:
+            while self._running:
+                now = time.monotonic()
+                ready = [p for p, job in self._pending.items() if job.not_before <= now]
+                if ready:
+                    path = ready[0]
+                    self._busy += 1
+                    self._writing = path
+                    return path, self._pending.pop(path)
+                wait = min((job.not_before for job in self._pending.values()), default=None)
+                self._cond.wait(None if wait is None else wait - now)
+        return None, None
+
+    def _worker(self):
+        # Соединение SQLite принадлежит потоку, который его открыл
+        if self.store_path is not None:
+            self._store = RunStore(self.store_path)
+        try:
+            self._work()
+        finally:
+            if self._store is not None:
+                self._store.close()
+
+    def _work(self):
+        while True:
+            path, job = self._next_job()
+            if path is None:
+                return
+            error = None
+            try:
+                self._write(path, job)
+            except Exception as e:
+                error = e
+
+            with self._cond:
+                self._busy -= 1
+                self._writing = None
+                # Повторяем только ошибки ввода-вывода (недоступен сетевой диск и т.п.)
+                if isinstance(error, OSError) and job.attempts + 1 < self.max_attempts:
+                    metrics.count('retries')
+                    self._requeue(path, job)
+                    error = None
+                    job = None
+                self._cond.notify_all()
+
+            if job is not None:
+                metrics.count('reports' if error is None else 'errors')
+            if job is not None and self.on_result is not None:
+                self.dispatch(lambda p=path, e=error: self.on_result(p, e))
+
+    def _requeue(self, path: str, job: _Job):
+        """Возвращает неудачную запись в очередь; более новые разделы важнее"""
+        job.attempts += 1
+        delay = min(self.retry_delay * 2 ** (job.attempts - 1), self.max_retry_delay)
+        newer = self._pending.get(path)
+        if newer is not None:
+            job.runs.update(newer.runs)
+        job.not_before = time.monotonic() + delay
+        self._pending[path] = job
+
+    def _write(self, path: str, job: _Job):
+        first_run = next(iter(job.runs.values()))[0]
+        with metrics.span('render'):
+            report = DailyReport.load(path, first_run.date)
+            for run, run_metrics in job.runs.values():
+                report.set_run(run, run_metrics)
+        with metrics.span('write'):
+            report.save(path)
+        # Прогон попадает в хранилище только вместе с записанным отчетом
+        if self._store is not None:
+            with metrics.span('store'):
+                self._store.save_many(job.runs.values())
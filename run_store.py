@@ -0,0 +1,293 @@
+"""
+Хранилище прогонов печей на базе SQLite.
+
+Каждый сформированный отчет сохраняется вместе со структурированными
+данными: дата, печь, четыре отметки времени, рассчитанные этапы,
+отклонения и уведомления. Повторная отправка той же печи за ту же дату
+заменяет запись. Индексы по (дата, печь) и по дате позволяют строить
+отчеты, статистику и повторный экспорт запросами, без разбора Markdown.
+
+Дополнительные этапы из файла нормативов хранятся в колонке extra_stages
+как JSON {этап: [минуты, отклонение]}; хранилище, созданное до ее
+появления, дополняется колонкой при открытии.
+
+Таблица day_index хранит сводку по каждой дате (число прогонов, наибольшее
+и наименьшее отклонение за день). Она пересчитывается для затронутых дат
+при каждом сохранении, поэтому календарь получает месяц одним запросом.
+"""
+import json
+import sqlite3
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from report_core import FurnaceRun, RunMetrics, format_date, format_mark, parse_date
+
+DEFAULT_DB_PATH = 'runs.sqlite3'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    run_date TEXT NOT NULL,          -- ISO-дата гггг-мм-дд для выборок по диапазону
+    furnace TEXT NOT NULL,
+    prog1_start TEXT NOT NULL,       -- ЧЧ:ММ, со сдвигом в днях ЧЧ:ММ+Д
+    prog1_end TEXT NOT NULL,
+    prog2_start TEXT NOT NULL,
+    prog2_end TEXT NOT NULL,
+    stage1_time INTEGER NOT NULL,    -- минуты
+    stage2_time INTEGER NOT NULL,
+    break_time INTEGER NOT NULL,
+    total_time INTEGER NOT NULL,
+    stage1_dev REAL NOT NULL,        -- проценты
+    stage2_dev REAL NOT NULL,
+    break_dev REAL NOT NULL,
+    total_dev REAL NOT NULL,
+    notifications TEXT NOT NULL DEFAULT '',
+    updated_at TEXT NOT NULL,
+    extra_stages TEXT NOT NULL DEFAULT '{}',  -- JSON {этап: [минуты, отклонение]}
+    UNIQUE (run_date, furnace)
+);
+CREATE INDEX IF NOT EXISTS idx_runs_date ON runs (run_date);
+CREATE TABLE IF NOT EXISTS day_index (
+    run_date TEXT PRIMARY KEY,
+    runs INTEGER NOT NULL,
+    max_dev REAL NOT NULL,           -- наибольшее отклонение этапа за день, %
+    min_dev REAL NOT NULL            -- наименьшее (самое отрицательное), %
+);
+'''
+
+_DAY_SUMMARY = (
+    "SELECT run_date, COUNT(*), "
+    "MAX(max(stage1_dev, stage2_dev, break_dev, total_dev)), "
+    "MIN(min(stage1_dev, stage2_dev, break_dev, total_dev)) FROM runs"
+)
+
+_REFRESH_DAY = (
+    "INSERT OR REPLACE INTO day_index (run_date, runs, max_dev, min_dev) "
+    + _DAY_SUMMARY + " WHERE run_date = ? GROUP BY run_date"
+)
+
+RUN_COLUMNS = (
+    'run_date', 'furnace', 'prog1_start', 'prog1_end', 'prog2_start', 'prog2_end',
+    'stage1_time', 'stage2_time', 'break_time', 'total_time',
+    'stage1_dev', 'stage2_dev', 'break_dev', 'total_dev',
+    'notifications', 'updated_at', 'extra_stages',
+)
+
+_UPSERT = (
+    f"INSERT INTO runs ({', '.join(RUN_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(RUN_COLUMNS))}) "
+    "ON CONFLICT (run_date, furnace) DO UPDATE SET "
+    + ', '.join(f'{c} = excluded.{c}' for c in RUN_COLUMNS[2:])
+)
+
+_SELECT = f"SELECT {', '.join(RUN_COLUMNS)} FROM runs"
+
+# Колонки, по которым можно листать страницы (page): у каждой есть индекс,
+# поэтому страница не требует сортировки всей таблицы
+SORT_COLUMNS = ('run_date', 'furnace') + RUN_COLUMNS[6:14]
+
+_SORT_INDEXES = ''.join(f"CREATE INDEX IF NOT EXISTS idx_runs_{column} ON runs ({column});\n"
+                        for column in SORT_COLUMNS[1:])
+
+
+def _to_iso(value) -> str:
+    """Приводит дату (date или строка дд.мм.гггг) к ISO-формату"""
+    if isinstance(value, date):
+        return value.isoformat()
+    return parse_date(value).isoformat()
+
+
+def _row_values(run: FurnaceRun, metrics: RunMetrics) -> tuple:
+    return (
+        _to_iso(run.date), run.furnace,
+        format_mark(run.prog1_start), format_mark(run.prog1_end),
+        format_mark(run.prog2_start), format_mark(run.prog2_end),
+        metrics.stage1_time, metrics.stage2_time, metrics.break_time, metrics.total_time,
+        metrics.stage1_dev, metrics.stage2_dev, metrics.break_dev, metrics.total_dev,
+        run.notifications.strip(), datetime.now().isoformat(timespec='seconds'),
+        json.dumps(metrics.extra_stages, ensure_ascii=False),
+    )
+
+
+def _from_row(row) -> Tuple[FurnaceRun, RunMetrics]:
+    run = FurnaceRun.from_text(
+        date=format_date(date.fromisoformat(row[0])),
+        furnace=row[1],
+        prog1_start=row[2],
+        prog1_end=row[3],
+        prog2_start=row[4],
+        prog2_end=row[5],
+        notifications=row[14],
+    )
+    metrics = RunMetrics(*row[6:14])
+    metrics.extra_stages = {stage: tuple(values) for stage, values in json.loads(row[16]).items()}
+    metrics.stages = {'цикл1': metrics.stage1_time, 'цикл2': metrics.stage2_time,
+                      'перерыв': metrics.break_time, 'общее': metrics.total_time,
+                      **{stage: minutes for stage, (minutes, _) in metrics.extra_stages.items()}}
+    return run, metrics
+
+
+def _where(start, end, furnace: Optional[str]) -> Tuple[str, list]:
+    """Условие выборки по диапазону дат и печи"""
+    conditions, params = [], []
+    if start is not None:
+        conditions.append('run_date >= ?')
+        params.append(_to_iso(start))
+    if end is not None:
+        conditions.append('run_date <= ?')
+        params.append(_to_iso(end))
+    if furnace is not None:
+        conditions.append('furnace = ?')
+        params.append(furnace)
+    return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), params
+
+
+class RunStore:
+    """
+    Встроенное хранилище прогонов.
+    Даты принимаются как в формате дд.мм.гггг, так и объектами date.
+    """
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self._add_extra_stages()
+        self.conn.executescript(_SORT_INDEXES)
+        self._fill_day_index()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _add_extra_stages(self):
+        """Добавляет колонку extra_stages в хранилище, созданное до ее появления"""
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(runs)')}
+        if 'extra_stages' not in columns:
+            with self.conn:
+                self.conn.execute(
+                    "ALTER TABLE runs ADD COLUMN extra_stages TEXT NOT NULL DEFAULT '{}'")
+
+    def _fill_day_index(self):
+        """Строит сводку по датам для хранилища, созданного до ее появления"""
+        if self.conn.execute('SELECT 1 FROM day_index LIMIT 1').fetchone() is None:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO day_index (run_date, runs, max_dev, min_dev) "
+                    + _DAY_SUMMARY + " GROUP BY run_date")
+
+    def save(self, run: FurnaceRun, metrics: RunMetrics):
+        """Сохраняет прогон, заменяя прежнюю запись той же печи за ту же дату"""
+        values = _row_values(run, metrics)
+        with self.conn:
+            self.conn.execute(_UPSERT, values)
+            self.conn.execute(_REFRESH_DAY, (values[0],))
+
+    def save_many(self, items: Iterable[Tuple[FurnaceRun, RunMetrics]]) -> int:
+        """Сохраняет много прогонов одной транзакцией, возвращает их число"""
+        rows = [_row_values(run, metrics) for run, metrics in items]
+        with self.conn:
+            cursor = self.conn.executemany(_UPSERT, rows)
+            self.conn.executemany(_REFRESH_DAY, ((day,) for day in {row[0] for row in rows}))
+        return cursor.rowcount
+
+    def updated_dates(self, since: Optional[str] = None) -> List[str]:
+        """ISO-даты прогонов, сохраненных не раньше since (все даты, если since не задан)"""
+        if since is None:
+            rows = self.conn.execute('SELECT run_date FROM day_index ORDER BY run_date')
+        else:
+            rows = self.conn.execute(
+                'SELECT DISTINCT run_date FROM runs WHERE updated_at >= ? ORDER BY run_date', (since,))
+        return [row[0] for row in rows]
+
+    def furnace_totals(self, start=None, end=None) -> Dict[str, Tuple[int, ...]]:
+        """
+        Суммы по печам за диапазон дат: печь -> (число прогонов,
+        суммы stage1_time..total_time, суммы stage1_dev..total_dev).
+        Считается в SQLite по уже рассчитанным при сохранении значениям.
+        """
+        where, params = _where(start, end, None)
+        sums = ', '.join(f'SUM({column})' for column in RUN_COLUMNS[6:14])
+        rows = self.conn.execute(
+            f"SELECT furnace, COUNT(*), {sums} FROM runs{where} GROUP BY furnace", params)
+        return {row[0]: row[1:] for row in rows}
+
+    def month_index(self, year: int, month: int) -> Dict[int, Tuple[int, float, float]]:
+        """
+        Сводка по дням месяца: день -> (число прогонов, наибольшее
+        и наименьшее отклонение). Дни без прогонов отсутствуют.
+        """
+        prefix = f"{year:04d}-{month:02d}-"
+        rows = self.conn.execute(
+            'SELECT run_date, runs, max_dev, min_dev FROM day_index '
+            'WHERE run_date BETWEEN ? AND ?', (prefix + '01', prefix + '31'))
+        return {int(run_date[8:]): (runs, max_dev, min_dev)
+                for run_date, runs, max_dev, min_dev in rows}
+
+    def get(self, run_date, furnace: str) -> Optional[Tuple[FurnaceRun, RunMetrics]]:
+        """Возвращает прогон печи за дату или None"""
+        row = self.conn.execute(
+            _SELECT + ' WHERE run_date = ? AND furnace = ?',
+            (_to_iso(run_date), furnace)).fetchone()
+        return _from_row(row) if row else None
+
+    def runs_for_date(self, run_date) -> List[Tuple[FurnaceRun, RunMetrics]]:
+        """Все прогоны за дату, упорядоченные по печи"""
+        rows = self.conn.execute(
+            _SELECT + ' WHERE run_date = ? ORDER BY furnace', (_to_iso(run_date),))
+        return [_from_row(row) for row in rows]
+
+    def select(self, columns, start=None, end=None, furnace: Optional[str] = None):
+        """
+        Курсор по указанным колонкам прогонов в диапазоне дат [start, end]
+        (границы включительно, любая может быть опущена), упорядоченный
+        по дате и печи. Используется для выборок без создания FurnaceRun.
+        """
+        where, params = _where(start, end, furnace)
+        query = f"SELECT {', '.join(columns)} FROM runs{where} ORDER BY run_date, furnace"
+        return self.conn.execute(query, params)
+
+    def count_dates(self, start=None, end=None, furnace: Optional[str] = None) -> int:
+        """Число дат с прогонами в диапазоне [start, end]"""
+        where, params = _where(start, end, furnace)
+        return self.conn.execute(
+            f"SELECT COUNT(DISTINCT run_date) FROM runs{where}", params).fetchone()[0]
+
+    def iter_runs(self, start=None, end=None,
+                  furnace: Optional[str] = None) -> Iterator[Tuple[FurnaceRun, RunMetrics]]:
+        """Потоково перебирает прогоны в диапазоне дат по дате и печи"""
+        for row in self.select(RUN_COLUMNS, start, end, furnace):
+            yield _from_row(row)
+
+    def page(self, columns, order: str = 'run_date', descending: bool = False,
+             after: Optional[tuple] = None, limit: int = 100, start=None, end=None,
+             furnace: Optional[str] = None) -> Tuple[List[tuple], Optional[tuple]]:
+        """
+        Страница прогонов, упорядоченных по колонке order из SORT_COLUMNS
+        (затем по id).
+        after - курсор, полученный с предыдущей страницей: следующая
+        страница выбирается по ключу, без OFFSET, поэтому дальние страницы
+        не дороже первых. Возвращает (строки, курсор следующей страницы
+        или None, если страница последняя).
+        """
+        if order not in SORT_COLUMNS:
+            raise ValueError(f"Неизвестная колонка сортировки: {order}")
+        where, params = _where(start, end, furnace)
+        direction = 'DESC' if descending else 'ASC'
+        if after is not None:
+            where += (' AND ' if where else ' WHERE ') + f"({order}, id) {'<' if descending else '>'} (?, ?)"
+            params.extend(after)
+        rows = self.conn.execute(
+            f"SELECT {order}, id, {', '.join(columns)} FROM runs{where} "
+            f"ORDER BY {order} {direction}, id {direction} LIMIT ?", params + [limit]).fetchall()
+        cursor = tuple(rows[-1][:2]) if len(rows) == limit else None
+        return [row[2:] for row in rows], cursor
+
+    def count(self, start=None, end=None, furnace: Optional[str] = None) -> int:
+        """Число прогонов в диапазоне дат (по умолчанию - всех)"""
+        where, params = _where(start, end, furnace)
+        return self.conn.execute(f"SELECT COUNT(*) FROM runs{where}", params).fetchone()[0]